@@ -0,0 +1,261 @@
+import gzip
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Not on Windows; appends are then only serialised within one process
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+_SEGMENT_NAME = re.compile(r"^seg-(\d{6})\.jsonl(\.gz|\.zst)?$")
+
+
+class MessageArchive:
+    """Append-only archive of processed messages in size-rotated segment files.
+
+    Messages are appended to seg-NNNNNN.jsonl until it reaches segment_bytes, then the
+    segment is closed (and compressed with gzip or zstd if configured) and a new one
+    is started. index.jsonl records, for every message, its segment and line together
+    with sender, recipient, task id and time, so replay() can go straight to the
+    segments it needs. When segments plus index exceed max_bytes the oldest segments
+    are dropped and the index is compacted to match.
+
+    Several processes (e.g. broker workers) may share an archive directory, so appends
+    take an exclusive lock on archive.lock and find the active segment and its line
+    count from disk rather than trusting what this process last wrote.
+    """
+
+    _shared = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, archive_dir, segment_bytes=1024 * 1024, compression=None, max_bytes=64 * 1024 * 1024):
+        self.archive_dir = archive_dir
+        self.index_path = os.path.join(archive_dir, "index.jsonl")
+        self.lock_path = os.path.join(archive_dir, "archive.lock")
+        os.makedirs(archive_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self.configure(segment_bytes=segment_bytes, compression=compression, max_bytes=max_bytes)
+        self._active = None
+        self._active_size = 0  # Size of the active segment when _active_lines was counted
+        self._active_lines = 0
+        self._index = None
+        self._index_size = 0  # Size of index.jsonl when _index was loaded
+
+    @classmethod
+    def shared(cls, archive_dir):
+        """One archive instance per directory, shared by all agents in the process."""
+        with cls._shared_lock:
+            if archive_dir not in cls._shared:
+                cls._shared[archive_dir] = cls(archive_dir)
+            return cls._shared[archive_dir]
+
+    def configure(self, segment_bytes=None, compression=None, max_bytes=None):
+        if compression == "zstd" and zstandard is None:
+            print("zstandard is not installed; compressing message archive segments with gzip instead.")
+            compression = "gzip"
+        if compression not in (None, "gzip", "zstd"):
+            raise ValueError(f"Unsupported archive compression: {compression}")
+        self.compression = compression
+        if segment_bytes is not None:
+            self.segment_bytes = segment_bytes
+        if max_bytes is not None:
+            self.max_bytes = max_bytes
+        return self
+
+    def _segments(self):
+        """(number, suffix) of every segment on disk, oldest first."""
+        found = []
+        for name in os.listdir(self.archive_dir):
+            match = _SEGMENT_NAME.match(name)
+            if match:
+                found.append((int(match.group(1)), match.group(2) or ""))
+        return sorted(found)
+
+    def _segment_path(self, number, suffix=""):
+        return os.path.join(self.archive_dir, f"seg-{number:06d}.jsonl{suffix}")
+
+    @staticmethod
+    def _count_lines(path):
+        if not os.path.exists(path):
+            return 0
+        with open(path, "rb") as f:
+            return sum(1 for _ in f)
+
+    @contextmanager
+    def _exclusive(self):
+        """Hold the thread lock and, where supported, an exclusive lock shared with other processes."""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.lock_path, "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _sync_active(self):
+        """Find the segment to append to and its line count; called with the lock held.
+
+        Another process may have appended to or rotated the archive since this one last
+        wrote, so the line count is only reused while the segment's size is unchanged.
+        """
+        segments = self._segments()
+        if not segments:
+            active = 1
+        else:
+            number, suffix = segments[-1]
+            full = suffix or os.path.getsize(self._segment_path(number)) >= self.segment_bytes
+            active = number + 1 if full else number
+        path = self._segment_path(active)
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        if active != self._active or size != self._active_size:
+            self._active, self._active_size, self._active_lines = active, size, self._count_lines(path)
+
+    def append(self, messages):
+        """Archive a batch of messages with one write to the active segment and the index."""
+        if not messages:
+            return
+        now = time.time()
+        with self._exclusive():
+            self._sync_active()
+            path = self._segment_path(self._active)
+            index_entries = []
+            with open(path, "a") as f:
+                for message in messages:
+                    f.write(json.dumps(message) + "\n")
+                    index_entries.append({
+                        "segment": self._active,
+                        "line": self._active_lines,
+                        "sender": message.get("sender"),
+                        "recipient": message.get("recipient"),
+                        "task_id": _task_id(message),
+                        "ts": now
+                    })
+                    self._active_lines += 1
+            self._active_size = os.path.getsize(path)
+            self._load_index()  # Pick up other processes' entries before adding ours
+            with open(self.index_path, "a") as f:
+                f.write("".join(json.dumps(e) + "\n" for e in index_entries))
+            self._index.extend(index_entries)
+            self._index_size = os.path.getsize(self.index_path)
+            if self._active_size >= self.segment_bytes:
+                self._rotate()
+
+    def _rotate(self):
+        closed = self._active
+        self._active += 1
+        self._active_size = self._active_lines = 0
+        if self.compression:
+            self._compress(closed)
+        self._enforce_retention()
+
+    def _compress(self, number):
+        source = self._segment_path(number)
+        suffix = ".gz" if self.compression == "gzip" else ".zst"
+        target = self._segment_path(number, suffix)
+        with open(source, "rb") as f:
+            data = f.read()
+        tmp_path = target + ".tmp"
+        if self.compression == "gzip":
+            with gzip.open(tmp_path, "wb") as f:
+                f.write(data)
+        else:
+            with open(tmp_path, "wb") as f:
+                f.write(zstandard.ZstdCompressor().compress(data))
+        os.replace(tmp_path, target)
+        os.remove(source)
+
+    def _enforce_retention(self):
+        # The budget covers the segments and the index entries that point into them
+        segments = self._segments()
+        index = self._load_index()
+        index_bytes = os.path.getsize(self.index_path) if os.path.exists(self.index_path) else 0
+        bytes_per_entry = index_bytes / len(index) if index else 0
+        entries_per_segment = {}
+        for e in index:
+            entries_per_segment[e["segment"]] = entries_per_segment.get(e["segment"], 0) + 1
+        total = index_bytes + sum(os.path.getsize(self._segment_path(*seg)) for seg in segments)
+        dropped = set()
+        for seg in segments:
+            if total <= self.max_bytes or seg[0] == self._active:
+                break
+            total -= os.path.getsize(self._segment_path(*seg))
+            total -= entries_per_segment.get(seg[0], 0) * bytes_per_entry
+            os.remove(self._segment_path(*seg))
+            dropped.add(seg[0])
+        if dropped:
+            # Compact the index so it only refers to segments that still exist
+            entries = [e for e in index if e["segment"] not in dropped]
+            tmp_path = self.index_path + ".tmp"
+            with open(tmp_path, "w") as f:
+                f.write("".join(json.dumps(e) + "\n" for e in entries))
+            os.replace(tmp_path, self.index_path)
+            self._index = entries
+            self._index_size = os.path.getsize(self.index_path)
+
+    def _load_index(self):
+        size = os.path.getsize(self.index_path) if os.path.exists(self.index_path) else 0
+        if self._index is None or size != self._index_size:
+            # Not loaded yet, or another process has written to the index since
+            self._index = []
+            self._index_size = size
+            if os.path.exists(self.index_path):
+                with open(self.index_path, "r") as f:
+                    for line in f:
+                        if line.strip():
+                            try:
+                                self._index.append(json.loads(line))
+                            except json.JSONDecodeError:
+                                continue  # Torn write
+        return self._index
+
+    def _read_segment(self, number, suffix):
+        path = self._segment_path(number, suffix)
+        if suffix == ".gz":
+            with gzip.open(path, "rt") as f:
+                return f.read().splitlines()
+        if suffix == ".zst":
+            if zstandard is None:
+                raise RuntimeError(f"zstandard is required to read {path}")
+            with open(path, "rb") as f:
+                return zstandard.ZstdDecompressor().decompressobj().decompress(f.read()).decode("utf-8").splitlines()
+        with open(path, "r") as f:
+            return f.read().splitlines()
+
+    def replay(self, agent=None, task_id=None, since=None, until=None):
+        """Yield archived messages in order, filtered by agent (sender or recipient), task id and time."""
+        with self._exclusive():
+            matches = [e for e in self._load_index()
+                       if (agent is None or agent in (e["sender"], e["recipient"]))
+                       and (task_id is None or e["task_id"] == task_id)
+                       and (since is None or e["ts"] >= since)
+                       and (until is None or e["ts"] <= until)]
+            suffixes = dict(self._segments())
+        cache = {}
+        for entry in matches:
+            number = entry["segment"]
+            if number not in suffixes:
+                continue
+            if number not in cache:
+                cache = {number: self._read_segment(number, suffixes[number])}  # Keep one segment in memory
+            lines = cache[number]
+            if entry["line"] < len(lines):
+                yield json.loads(lines[entry["line"]])
+
+
+def _task_id(message):
+    body = message.get("message")
+    if not isinstance(body, dict):
+        return None
+    if isinstance(body.get("task"), dict):
+        return body["task"].get("id")
+    return body.get("task_id")
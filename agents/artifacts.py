@@ -0,0 +1,116 @@
+import hashlib
+import json
+import os
+import shutil
+import stat
+import threading
+import time
+
+
+class ArtifactStore:
+    """Content-addressed store for generated sources.
+
+    Objects live under artifacts/objects/<sha[:2]>/<sha> and are never modified once
+    written, so identical generations are stored once. An append-only manifest maps
+    (run, task, agent) to the object each produced. Files in src/ are materialised as
+    ordinary writable copies of the stored objects, so editing or overwriting one can
+    never change a stored object or the other files made from it.
+    """
+
+    def __init__(self, project_dir, dirname="artifacts"):
+        self.root = os.path.join(project_dir, dirname)
+        self.objects_dir = os.path.join(self.root, "objects")
+        self.manifest_path = os.path.join(self.root, "manifest.jsonl")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._entries = []
+        self._by_task = {}
+        self._by_run = {}
+        self._by_name = {}
+        self._manifest_offset = 0
+
+    def object_path(self, sha):
+        return os.path.join(self.objects_dir, sha[:2], sha)
+
+    def put(self, content):
+        """Store text content and return its sha256; a no-op if it is already stored."""
+        data = content.encode("utf-8")
+        sha = hashlib.sha256(data).hexdigest()
+        path = self.object_path(sha)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.chmod(tmp_path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)  # Objects are immutable
+            os.replace(tmp_path, path)
+        return sha
+
+    def read(self, sha):
+        with open(self.object_path(sha), "r") as f:
+            return f.read()
+
+    def record(self, sha, name, task_id, agent, run_id=None):
+        """Append a manifest entry saying that agent produced object sha as file name for a task."""
+        entry = {"ts": time.time(), "run_id": run_id, "task_id": task_id, "agent": agent, "name": name, "sha": sha}
+        with self._lock:
+            with open(self.manifest_path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+        return entry
+
+    def materialize(self, sha, dest):
+        """Write a copy of the stored object to dest, replacing whatever is there."""
+        tmp_path = f"{dest}.{os.getpid()}.{threading.get_ident()}.tmp"
+        shutil.copyfile(self.object_path(sha), tmp_path)  # Content only; the copy is writable
+        os.replace(tmp_path, dest)
+        return dest
+
+    def _refresh(self):
+        # Only read manifest lines appended since the last lookup
+        if not os.path.exists(self.manifest_path):
+            return
+        with self._lock:
+            with open(self.manifest_path, "rb") as f:
+                f.seek(self._manifest_offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # Partially written entry; pick it up next time
+                    self._manifest_offset += len(line)
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._entries.append(entry)
+                        self._by_task.setdefault(entry["task_id"], []).append(entry)
+                        self._by_run.setdefault(entry["run_id"], []).append(entry)
+                        self._by_name[entry["name"]] = entry
+
+    def lookup(self, task_id=None, agent=None, run_id=None):
+        """Manifest entries matching the given filters, oldest first."""
+        self._refresh()
+        if task_id is not None:
+            candidates = self._by_task.get(task_id, [])
+        elif run_id is not None:
+            candidates = self._by_run.get(run_id, [])
+        else:
+            candidates = self._entries
+        return [e for e in candidates
+                if (task_id is None or e["task_id"] == task_id)
+                and (agent is None or e["agent"] == agent)
+                and (run_id is None or e["run_id"] == run_id)]
+
+    def latest(self, name):
+        """The most recent manifest entry for file name, or None."""
+        self._refresh()
+        return self._by_name.get(name)
+
+    def runs(self):
+        """Run ids in the manifest, oldest first."""
+        self._refresh()
+        return list(self._by_run)
+
+    def rollback(self, run_id, dest_dir):
+        """Materialise the files a run produced into dest_dir; returns the paths written."""
+        latest = {}
+        for e in self.lookup(run_id=run_id):
+            latest[e["name"]] = e["sha"]
+        os.makedirs(dest_dir, exist_ok=True)
+        return [self.materialize(sha, os.path.join(dest_dir, name)) for name, sha in sorted(latest.items())]
@@ -2,9 +2,27 @@ import json
 import os
 import glob2 as glob
 from abc import ABC, abstractmethod
-import requests
+from .llm import LocalModelClient, ChatSession
+from .archive import MessageArchive
+from .reasoning import ReasoningPolicy
+from .topics import TopicBus
+from . import trace
+
+
+def merge_options(profile, reasoning_options, model_options):
+    """Ollama options from the hardware profile, then the reasoning budget, then configured model_options."""
+    options = dict(profile)
+    for key, value in reasoning_options.items():
+        # Both set upper bounds on the context window; the smaller one wins
+        options[key] = min(value, options[key]) if key == "num_ctx" and key in options else value
+    options.update(model_options)
+    return options
+
 
 class BaseAgent(ABC):
+    # Role framing shared by every prompt this agent sends; kept stable so it can be cached
+    system_prompt = None
+
     def __init__(self, name, role, skills, description, project_dir, timeout=120):
         self.name = name
         self.role = role
@@ -13,89 +31,103 @@ class BaseAgent(ABC):
         self.project_dir = project_dir
         self.comms_dir = os.path.join(project_dir, "comms")
         os.makedirs(self.comms_dir, exist_ok=True)
+        self.archive = MessageArchive.shared(os.path.join(project_dir, "archive"))
+        self.topics = TopicBus(self.comms_dir)
+        self.subscriptions = []  # Topics this agent reads, from "subscribe" in config/agents.json
+        self.weight = 1.0  # Share of scheduler turns relative to other agents, from "weight" in config/agents.json
         self.api_url = "http://localhost:11434/api/chat"
         self.timeout = timeout
+        self.llm = LocalModelClient(name, api_url=self.api_url, timeout=timeout, keep_alive=-1)
+        self.session = None
+        self.cancel_token = None  # Set by the orchestrator; cancels in-flight model calls
+        self.model_options = {}  # Per-agent Ollama options from config/agents.json
+        self.inference_profile = {}  # Hardware-derived options (num_thread, num_batch, ...) set by load_agents
+        self.reasoning = ReasoningPolicy()
+
+    def enable_session(self, max_turns=4, max_chars=8000):
+        """Keep a persistent conversation so repeated calls share a cached prompt prefix."""
+        self.session = ChatSession(self.system_prompt, max_turns=max_turns, max_chars=max_chars)
 
-    def call_local_model(self, prompt):
-        """Call the local qwen3-custom model API with retries and robust error handling."""
-        import time
-        payload = {
-            "model": "qwen3-custom",
-            "messages": [{"role": "user", "content": f"{prompt} /think"}],
-            "stream": False
-        }
-        retries = 0
-        max_retries = 3
-        backoff = 2
-
-        url = "http://localhost:11434/api/generate"
-        data = {
-            "model": "qwen-custom",
-            "prompt": prompt,
-            "stream": False
-           }
-        if hasattr(self, 'use_gpu') and self.use_gpu:
-            data["options"] = {
-                "num_gpu": -1,  # Offload all layers to GPU
-                "keep_alive": -1  # Keep model loaded indefinitely to avoid reload delays
-            }
-        else:
-            data["options"] = {
-                "keep_alive": -1  # Still useful for CPU to avoid unloading
-            }
-
-
-        while retries < max_retries:
-            try:
-                response = requests.post(self.api_url, json=payload, timeout=self.timeout)
-                response.raise_for_status()
-                return response.json()["message"]["content"]
-            except requests.Timeout:
-                print(f"{self.name} API call timed out after {self.timeout} seconds. Retrying ({retries+1}/{max_retries})...")
-            except requests.ConnectionError as e:
-                print(f"{self.name} API connection error: {e}. Retrying ({retries+1}/{max_retries})...")
-            except requests.RequestException as e:
-                print(f"{self.name} API call failed: {e}. Retrying ({retries+1}/{max_retries})...")
-            time.sleep(backoff * (2 ** retries))
-            retries += 1
-        print(f"{self.name} failed to get a response from the local model after {max_retries} attempts.")
-        return None
+    def build_messages(self, prompt):
+        """Chat messages for a prompt: system prompt, session history (if any), then the prompt."""
+        if self.session:
+            return self.session.build_messages(prompt)
+        messages = [{"role": "system", "content": self.system_prompt}] if self.system_prompt else []
+        messages.append({"role": "user", "content": prompt})
+        return messages
+
+    def call_options(self, think, tasks=1):
+        """Ollama options for one call: hardware profile, then reasoning budget, then configured model_options.
+
+        The generation budget is multiplied by tasks when one reply answers several tasks.
+        """
+        options = merge_options(self.inference_profile, self.reasoning.options(think), self.model_options)
+        if options.get("num_predict", 0) > 0:
+            options["num_predict"] *= tasks
+        return options
+
+    def call_local_model(self, prompt, think=True, tasks=1):
+        """Call this agent's local model with retries and robust error handling."""
+        prompt = f"{prompt} {self.reasoning.suffix(think)}"
+        messages = self.build_messages(prompt)
+        with trace.span("llm_wait", self.name):
+            reply = self.llm.chat(messages, options=self.call_options(think, tasks) or None, cancel_event=self.cancel_token)
+        if reply is not None and self.session:
+            self.session.add_turn(prompt, reply)
+        return reply
 
     def send_message(self, recipient, message):
         """Send a message to another agent via file-based queue, avoiding duplicates."""
-        message_data = {"sender": self.name, "recipient": recipient, "message": message}
-        message_file = os.path.join(self.comms_dir, f"msg_{recipient}_{self.name}.json")
-        
-        existing_messages = []
-        if os.path.exists(message_file):
-            with open(message_file, "r") as f:
-                for line in f:
-                    if line.strip():
-                        existing_messages.append(json.loads(line.strip()))
+        with trace.span("message_send", self.name):
+            message_data = {"sender": self.name, "recipient": recipient, "message": message}
+            message_file = os.path.join(self.comms_dir, f"msg_{recipient}_{self.name}.json")
         
-        if message_data not in existing_messages:
-            with open(message_file, "a") as f:
-                json.dump(message_data, f)
-                f.write("\n")
-
-    def receive_messages(self):
-        """Read messages intended for this agent and move them to a processed file."""
-        messages = []
-        message_file_pattern = os.path.join(self.comms_dir, f"msg_{self.name}_*.json")
-        processed_dir = os.path.join(self.comms_dir, "processed")
-        os.makedirs(processed_dir, exist_ok=True)
-
-        for message_file in glob.glob(message_file_pattern):
+            existing_messages = []
             if os.path.exists(message_file):
                 with open(message_file, "r") as f:
                     for line in f:
                         if line.strip():
-                            messages.append(json.loads(line.strip()))
+                            existing_messages.append(json.loads(line.strip()))
+        
+            if message_data not in existing_messages:
+                with open(message_file, "a") as f:
+                    json.dump(message_data, f)
+                    f.write("\n")
+
+    def receive_messages(self):
+        """Read messages intended for this agent and append them to the message archive."""
+        with trace.span("message_receive", self.name):
+            messages = []
+            message_file_pattern = os.path.join(self.comms_dir, f"msg_{self.name}_*.json")
+
+            for message_file in glob.glob(message_file_pattern):
+                if os.path.exists(message_file):
+                    file_messages = []
+                    with open(message_file, "r") as f:
+                        for line in f:
+                            if line.strip():
+                                file_messages.append(json.loads(line.strip()))
                 
-                processed_file = os.path.join(processed_dir, os.path.basename(message_file))
-                os.rename(message_file, processed_file)
+                    self.archive.append(file_messages)
+                    os.remove(message_file)
+                    messages.extend(file_messages)
 
-        return messages
+            return messages
+
+    def publish(self, topic, message):
+        """Broadcast a message to every subscriber of topic with a single write."""
+        with trace.span("message_send", self.name):
+            record = self.topics.publish(topic, self.name, message)
+            self.archive.append([{"sender": self.name, "recipient": f"topic:{topic}", "message": message}])
+            return record
+
+    def receive_topic_messages(self):
+        """Read what other agents published on this agent's subscribed topics since the last read."""
+        with trace.span("message_receive", self.name):
+            messages = []
+            for topic in self.subscriptions:
+                messages.extend(m for m in self.topics.read(topic, self.name) if m["sender"] != self.name)
+            return messages
 
     @abstractmethod
     def perform_task(self, task):
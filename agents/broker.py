@@ -0,0 +1,215 @@
+import itertools
+import json
+import threading
+import time
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import requests
+
+
+class QueueFull(Exception):
+    """Raised when a queue is at max_depth and cannot accept more messages."""
+
+
+class MessageBroker:
+    """In-memory work queues with leases, acknowledgements and redelivery.
+
+    A consumed message is leased to its consumer for visibility_timeout seconds. If it
+    is not acked in time (the worker died or hung) it goes back on its queue. Queues
+    refuse publishes past max_depth, and a consumer holding `prefetch` unacked messages
+    gets nothing more until it acks, so slow workers do not hoard work.
+    """
+
+    def __init__(self, max_depth=1000, visibility_timeout=300, prefetch=1, max_attempts=5):
+        self.max_depth = max_depth
+        self.visibility_timeout = visibility_timeout
+        self.prefetch = prefetch
+        self.max_attempts = max_attempts
+        self.queues = {}
+        self.messages = {}  # id -> {"queue", "body", "attempts"}
+        self.leases = {}  # id -> (consumer, expiry)
+        self.dead = []  # Messages that exceeded max_attempts
+        self._ids = itertools.count(1)
+        self._cond = threading.Condition()
+
+    def publish(self, queue, body):
+        with self._cond:
+            pending = self.queues.setdefault(queue, deque())
+            if len(pending) >= self.max_depth:
+                raise QueueFull(queue)
+            message_id = str(next(self._ids))
+            self.messages[message_id] = {"queue": queue, "body": body, "attempts": 0}
+            pending.append(message_id)
+            self._cond.notify_all()
+            return message_id
+
+    def _requeue_expired(self):
+        now = time.monotonic()
+        for message_id, (consumer, expiry) in list(self.leases.items()):
+            if expiry <= now:
+                del self.leases[message_id]
+                self._requeue(message_id)
+
+    def _requeue(self, message_id):
+        message = self.messages[message_id]
+        if message["attempts"] >= self.max_attempts:
+            self.dead.append(self.messages.pop(message_id))
+            return
+        self.queues.setdefault(message["queue"], deque()).appendleft(message_id)
+        self._cond.notify_all()
+
+    def consume(self, queue, consumer, wait=0):
+        """Lease the next message on queue to consumer, waiting up to wait seconds.
+
+        Returns (id, body, attempts) or None.
+        """
+        end = time.monotonic() + wait
+        with self._cond:
+            while True:
+                self._requeue_expired()
+                held = sum(1 for c, _ in self.leases.values() if c == consumer)
+                pending = self.queues.get(queue)
+                if pending and held < self.prefetch:
+                    message_id = pending.popleft()
+                    message = self.messages[message_id]
+                    message["attempts"] += 1
+                    self.leases[message_id] = (consumer, time.monotonic() + self.visibility_timeout)
+                    return message_id, message["body"], message["attempts"]
+                left = end - time.monotonic()
+                if left <= 0:
+                    return None
+                self._cond.wait(min(left, 1.0))
+
+    def ack(self, message_id):
+        with self._cond:
+            if self.leases.pop(message_id, None) is None:
+                return False
+            self.messages.pop(message_id, None)
+            self._cond.notify_all()
+            return True
+
+    def nack(self, message_id, requeue=True):
+        with self._cond:
+            if self.leases.pop(message_id, None) is None:
+                return False
+            if requeue:
+                self._requeue(message_id)
+            else:
+                self.dead.append(self.messages.pop(message_id))
+            return True
+
+    def stats(self):
+        with self._cond:
+            self._requeue_expired()
+            return {
+                "queues": {name: len(pending) for name, pending in self.queues.items()},
+                "in_flight": len(self.leases),
+                "dead": len(self.dead)
+            }
+
+
+class BrokerRequestHandler(BaseHTTPRequestHandler):
+    """HTTP front end: POST /queues/<q>/publish, POST /queues/<q>/consume?consumer=&wait=,
+    POST /messages/<id>/ack, POST /messages/<id>/nack, GET /stats."""
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body=None):
+        data = json.dumps(body).encode("utf-8") if body is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if urlparse(self.path).path == "/stats":
+            self._reply(200, self.server.broker.stats())
+        else:
+            self._reply(404, {"error": "not found"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        parts = url.path.strip("/").split("/")
+        query = parse_qs(url.query)
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length)) if length else None
+        broker = self.server.broker
+        if len(parts) == 3 and parts[0] == "queues" and parts[2] == "publish":
+            try:
+                self._reply(202, {"id": broker.publish(parts[1], body)})
+            except QueueFull:
+                self._reply(429, {"error": f"queue {parts[1]} is full"})
+        elif len(parts) == 3 and parts[0] == "queues" and parts[2] == "consume":
+            consumer = query.get("consumer", [self.client_address[0]])[0]
+            wait = min(float(query.get("wait", ["0"])[0]), 30.0)
+            leased = broker.consume(parts[1], consumer, wait=wait)
+            if leased is None:
+                self._reply(204)
+            else:
+                message_id, message_body, attempts = leased
+                self._reply(200, {"id": message_id, "body": message_body, "attempts": attempts})
+        elif len(parts) == 3 and parts[0] == "messages" and parts[2] in ("ack", "nack"):
+            if parts[2] == "ack":
+                ok = broker.ack(parts[1])
+            else:
+                ok = broker.nack(parts[1], requeue=(body or {}).get("requeue", True))
+            self._reply(200 if ok else 404, {"ok": ok})
+        else:
+            self._reply(404, {"error": "not found"})
+
+
+def serve_broker(host="127.0.0.1", port=8765, broker=None):
+    """Create (but do not start) an HTTP server exposing a MessageBroker."""
+    server = ThreadingHTTPServer((host, port), BrokerRequestHandler)
+    server.daemon_threads = True
+    server.broker = broker or MessageBroker()
+    return server
+
+
+class BrokerClient:
+    """Client for a broker served by serve_broker()."""
+
+    def __init__(self, url, consumer=None, timeout=60):
+        self.url = url.rstrip("/")
+        self.consumer = consumer
+        self.timeout = timeout
+        self.http = requests.Session()
+
+    def publish(self, queue, body, cancel_token=None):
+        """Publish, backing off while the queue is full."""
+        delay = 0.1
+        while True:
+            response = self.http.post(f"{self.url}/queues/{queue}/publish", json=body, timeout=self.timeout)
+            if response.status_code != 429:
+                response.raise_for_status()
+                return response.json()["id"]
+            if cancel_token is not None and cancel_token.wait(delay):
+                return None
+            if cancel_token is None:
+                time.sleep(delay)
+            delay = min(delay * 2, 5.0)
+
+    def consume(self, queue, wait=5):
+        """Returns a dict with id, body and attempts, or None if nothing arrived in time."""
+        response = self.http.post(f"{self.url}/queues/{queue}/consume",
+                                  params={"consumer": self.consumer, "wait": wait},
+                                  timeout=self.timeout + wait)
+        if response.status_code == 204:
+            return None
+        response.raise_for_status()
+        return response.json()
+
+    def ack(self, message_id):
+        self.http.post(f"{self.url}/messages/{message_id}/ack", timeout=self.timeout).raise_for_status()
+
+    def nack(self, message_id, requeue=True):
+        self.http.post(f"{self.url}/messages/{message_id}/nack", json={"requeue": requeue},
+                       timeout=self.timeout).raise_for_status()
+
+    def stats(self):
+        response = self.http.get(f"{self.url}/stats", timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
@@ -0,0 +1,63 @@
+import threading
+import time
+
+
+class Cancelled(Exception):
+    """Raised by CancelToken.check() once a token is cancelled or past its deadline."""
+
+
+class CancelToken:
+    """Cooperative cancellation flag with an optional deadline.
+
+    A token is cancelled when cancel() is called on it or any of its parents, or when
+    its deadline passes. It offers the same is_set()/wait() interface as
+    threading.Event, so it can be passed wherever a cancel event is accepted.
+    """
+
+    def __init__(self, timeout=None, parent=None):
+        self._event = threading.Event()
+        self.parent = parent
+        self.deadline = time.monotonic() + timeout if timeout is not None else None
+        if parent is not None and parent.deadline is not None:
+            self.deadline = parent.deadline if self.deadline is None else min(self.deadline, parent.deadline)
+        self.reason = None
+
+    def child(self, timeout=None):
+        """A token that is cancelled with this one, optionally with a tighter deadline."""
+        return CancelToken(timeout=timeout, parent=self)
+
+    def cancel(self, reason="cancelled"):
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    def is_set(self):
+        if self._event.is_set():
+            return True
+        if self.parent is not None and self.parent.is_set():
+            self.cancel(self.parent.reason)
+            return True
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel("deadline exceeded")
+            return True
+        return False
+
+    def remaining(self, default=None):
+        """Seconds left before the deadline, or default if there is none."""
+        if self.deadline is None:
+            return default
+        return max(0.0, self.deadline - time.monotonic())
+
+    def wait(self, seconds):
+        """Sleep up to seconds, waking early on cancellation. Returns True if cancelled."""
+        end = time.monotonic() + seconds
+        while not self.is_set():
+            left = end - time.monotonic()
+            if left <= 0:
+                return False
+            self._event.wait(min(left, 0.1))
+        return True
+
+    def check(self):
+        if self.is_set():
+            raise Cancelled(self.reason)
@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+class Cassette:
+    """Recorded model traffic, so a sprint can be re-run offline with identical output.
+
+    In "record" mode every chat and embedding request that gets a response is appended
+    to a JSONL file with the reply, its timing stats and the wall-clock latency. In
+    "replay" mode the same requests are answered from the file without contacting the
+    server, immediately or, with realtime=True, after the recorded latency.
+
+    Requests are matched on the model, the messages (or embedding input) and the
+    sampling options (seed, temperature, ...), but not on the hardware options, so a
+    cassette recorded on one machine replays on another whose hardware profile differs
+    while speculative candidates with different seeds keep their own answers.
+    Identical requests are answered in the order they were recorded; once those run
+    out the last answer is repeated.
+    """
+
+    RECORD = "record"
+    REPLAY = "replay"
+    SAMPLING_OPTIONS = ("seed", "temperature", "top_k", "top_p", "min_p")  # Options that change the reply
+
+    def __init__(self, path, mode=REPLAY, realtime=False):
+        if mode not in (self.RECORD, self.REPLAY):
+            raise ValueError(f"Unknown cassette mode {mode!r}")
+        self.path = path
+        self.mode = mode
+        self.realtime = realtime
+        self.entries = {}  # key -> recorded entries, in order
+        self.served = {}  # key -> number of entries replayed
+        self.recorded = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if mode == self.RECORD:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            open(path, "w").close()
+        else:
+            with open(path, "r") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # Torn last line from an interrupted recording
+                    self.entries.setdefault(entry["key"], []).append(entry)
+
+    @property
+    def replaying(self):
+        return self.mode == self.REPLAY
+
+    @classmethod
+    def chat_body(cls, messages, options=None):
+        """The part of a chat request that determines its reply."""
+        sampling = {k: v for k, v in (options or {}).items() if k in cls.SAMPLING_OPTIONS}
+        return {"messages": messages, "sampling": sampling}
+
+    @staticmethod
+    def key(kind, model, body):
+        data = json.dumps([kind, model, body], sort_keys=True)
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    def record(self, kind, model, body, response, stats=None, latency=0.0):
+        entry = {
+            "key": self.key(kind, model, body),
+            "kind": kind,
+            "model": model,
+            "request": body,
+            "response": response,
+            "stats": stats or {},
+            "latency": latency
+        }
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+            self.recorded += 1
+
+    def replay(self, kind, model, body, cancel_event=None):
+        """The recorded entry for a request, or None if it was never recorded or the wait was cancelled."""
+        key = self.key(kind, model, body)
+        with self._lock:
+            entries = self.entries.get(key)
+            if not entries:
+                self.misses += 1
+                return None
+            index = self.served.get(key, 0)
+            self.served[key] = index + 1
+            self.hits += 1
+            entry = entries[min(index, len(entries) - 1)]
+        if self.realtime and entry["latency"]:
+            if cancel_event is not None:
+                if cancel_event.wait(entry["latency"]):
+                    return None
+            else:
+                time.sleep(entry["latency"])
+        return entry
+
+    def summary(self):
+        if self.replaying:
+            return f"Cassette {self.path}: {self.hits} request(s) replayed, {self.misses} not recorded"
+        return f"Cassette {self.path}: {self.recorded} request(s) recorded"
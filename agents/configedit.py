@@ -0,0 +1,68 @@
+import json
+import re
+
+# Edits to JSON config text that rewrite only the values they change, so a hand-formatted
+# config/agents.json (one-line arrays, key order, spacing) keeps its layout.
+
+_SEPARATORS = re.compile(r"[\s,]*")
+_COLON = re.compile(r"\s*:\s*")
+_decoder = json.JSONDecoder()
+
+
+def root(text):
+    """Position of the top-level object's opening brace."""
+    return len(text) - len(text.lstrip())
+
+
+def members(text, start):
+    """[(key, key position, value start, value end)] of the object whose "{" is at text[start]."""
+    found = []
+    pos = start + 1
+    while True:
+        pos = _SEPARATORS.match(text, pos).end()
+        if text[pos] == "}":
+            return found
+        key_pos = pos
+        key, pos = _decoder.raw_decode(text, pos)
+        pos = _COLON.match(text, pos).end()
+        _, end = _decoder.raw_decode(text, pos)
+        found.append((key, key_pos, pos, end))
+        pos = end
+
+
+def elements(text, start):
+    """[(start, end)] of the values in the array whose "[" is at text[start]."""
+    found = []
+    pos = start + 1
+    while True:
+        pos = _SEPARATORS.match(text, pos).end()
+        if text[pos] == "]":
+            return found
+        _, end = _decoder.raw_decode(text, pos)
+        found.append((pos, end))
+        pos = end
+
+
+def value_start(text, start, key):
+    """Position of key's value in the object at text[start], or None."""
+    return next((value_pos for name, _, value_pos, _ in members(text, start) if name == key), None)
+
+
+def set_member(text, start, key, value):
+    """Set key to value in the object at text[start], touching nothing else.
+
+    A new key is added after the last one, on its own line with the same indentation
+    if the object is laid out one key per line.
+    """
+    encoded = json.dumps(value)
+    found = members(text, start)
+    for name, _, value_pos, end in found:
+        if name == key:
+            return text[:value_pos] + encoded + text[end:]
+    if not found:
+        return text[:start + 1] + f'{json.dumps(key)}: {encoded}' + text[start + 1:]
+    key_pos, end = found[0][1], found[-1][3]
+    line_start = text.rfind("\n", start, key_pos) + 1
+    indent = text[line_start:key_pos]
+    separator = f",\n{indent}" if line_start and not indent.strip() else ", "
+    return text[:end] + f'{separator}{json.dumps(key)}: {encoded}' + text[end:]
@@ -0,0 +1,506 @@
+"""Long-running agent daemon.
+
+The daemon loads agents once and keeps them, their model clients, sessions and
+reasoning state, and the hardware probe result warm across submissions. Batches of
+tasks are submitted over HTTP, either on a TCP port or on a Unix socket, and run one
+at a time on a single runner thread. Progress comes back as a stream of newline
+delimited JSON events. When config/agents.json changes, the agents are rebuilt
+between submissions, so the running submission keeps the agents it started with.
+
+Submissions are queued by class ("interactive" before "batch") and then priority.
+When an interactive submission arrives while a batch one runs, the batch yields
+after its current task and goes back on the queue; it later resumes the same run.
+
+    POST /submissions[?stream=1]       {"tasks": [...], "class": ..., "priority": N} -> {"id": ...},
+                                       or the event stream
+    GET  /submissions/<id>             state, run id and per-task results
+    GET  /submissions/<id>/events?since=N   event stream from sequence number N
+    POST /submissions/<id>/cancel
+    POST /reload                       rebuild agents before the next submission
+    GET  /status
+"""
+import http.client
+import itertools
+import json
+import os
+import queue
+import socket
+import socketserver
+import sys
+import threading
+import time
+import uuid
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from .cancel import CancelToken
+from .journal import RunJournal
+from .progress import ProgressTracker
+from .scheduler import BATCH, CLASS_RANK, class_rank
+
+DEFAULT_DAEMON_URL = "http://127.0.0.1:8766"
+
+
+class DaemonError(Exception):
+    """The daemon rejected a request."""
+
+
+class Submission:
+    """A batch of tasks submitted to the daemon, with its progress events."""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    PREEMPTED = "preempted"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+    def __init__(self, tasks, task_class=BATCH, priority=0):
+        self.id = uuid.uuid4().hex[:12]
+        self.tasks = tasks
+        self.task_class = task_class
+        self.priority = priority
+        self.state = self.QUEUED
+        self.run_id = None
+        self.results = {}
+        self.submitted = time.time()
+        self.cancel_token = None  # Created when the submission starts running
+        self.started = None  # When it first started running; relative task deadlines count from here
+        self.events = []
+        self._partial = ""
+        self._cond = threading.Condition()
+
+    @property
+    def rank(self):
+        """Queue order: lower runs first."""
+        return (class_rank(self.task_class), -self.priority)
+
+    @property
+    def finished(self):
+        return self.state in (self.DONE, self.FAILED, self.CANCELLED)
+
+    def emit(self, kind, **fields):
+        with self._cond:
+            self.events.append(dict(fields, seq=len(self.events), ts=time.time(), type=kind))
+            self._cond.notify_all()
+
+    def write(self, text):
+        """Turn printed output into one "log" event per line."""
+        with self._cond:
+            self._partial += text
+            while "\n" in self._partial:
+                line, self._partial = self._partial.split("\n", 1)
+                if line.strip():
+                    self.emit("log", text=line)
+
+    def finish(self, state, results=None):
+        with self._cond:
+            self.state = state
+            self.results = results or {}
+            self.emit("state", state=state, run_id=self.run_id, results=self.results)
+
+    def events_since(self, seq, wait=15.0):
+        """Events from seq on, waiting up to wait seconds for new ones while the submission is open."""
+        with self._cond:
+            if len(self.events) <= seq and not self.finished:
+                self._cond.wait(wait)
+            return self.events[seq:]
+
+    def summary(self):
+        return {
+            "id": self.id,
+            "state": self.state,
+            "run_id": self.run_id,
+            "tasks": len(self.tasks),
+            "class": self.task_class,
+            "priority": self.priority,
+            "submitted": self.submitted,
+            "results": self.results,
+            "events": len(self.events)
+        }
+
+
+class _DaemonOutput:
+    """sys.stdout replacement that also copies output into the running submission's events."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.submission = None
+
+    def write(self, text):
+        self.stream.write(text)
+        submission = self.submission
+        if submission is not None:
+            submission.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+
+class AgentDaemon:
+    """Runs submitted task batches on agents that stay loaded between submissions.
+
+    load_agents(config_file, project_dir) builds the agents and run_tasks(agents, tasks,
+    journal, cancel_token, preempt=..., start=...) runs a batch on them, returning True
+    if it yielded to preempt; main.py provides both. A preempted submission resumes
+    the same journal run, and its deadlines keep counting from when it first started.
+    """
+
+    def __init__(self, project_dir, config_file, load_agents, run_tasks, keep_finished=100):
+        self.project_dir = project_dir
+        self.config_file = config_file
+        self.keep_finished = keep_finished
+        self._load_agents = load_agents
+        self._run_tasks = run_tasks
+        self.cancel_token = CancelToken()
+        self.journal = RunJournal(project_dir)
+        self.journal.listeners.append(ProgressTracker.shared(project_dir).record)
+        self.agents = None
+        self.config_mtime = None
+        self.submissions = {}
+        self.current = None
+        self.pending = queue.PriorityQueue()  # (rank, seq, submission)
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._reload_requested = False
+        self._output = None
+        self._runner = threading.Thread(target=self._run, name="daemon-runner", daemon=True)
+        self.reload(force=True)
+
+    def start(self):
+        self._output = _DaemonOutput(sys.stdout)
+        sys.stdout = self._output
+        self._runner.start()
+
+    def stop(self, timeout=5.0):
+        self.cancel_token.cancel("daemon stopping")
+        self.pending.put(((-1,), next(self._seq), None))
+        self._runner.join(timeout)
+        if self._output is not None and sys.stdout is self._output:
+            sys.stdout = self._output.stream
+
+    def reload(self, force=False):
+        """Rebuild the agents if the config file changed. Only called between submissions."""
+        try:
+            mtime = os.path.getmtime(self.config_file)
+            if not force and mtime == self.config_mtime:
+                return False
+            agents = self._load_agents(self.config_file, self.project_dir)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            if self.agents is None:
+                raise
+            if isinstance(e, OSError):
+                # E.g. an editor replacing the file; retry every time, but only say so once
+                if self.config_mtime is not None:
+                    print(f"Keeping the current agents; could not reload {self.config_file}: {e}")
+                self.config_mtime = None
+            else:
+                print(f"Keeping the current agents; could not reload {self.config_file}: {e}")
+                self.config_mtime = mtime  # Don't retry until the file changes again
+            return False
+        self.agents, self.config_mtime = agents, mtime
+        print(f"Loaded {len(agents)} agent(s) from {self.config_file}")
+        return True
+
+    def request_reload(self):
+        self._reload_requested = True
+
+    def submit(self, tasks, task_class=BATCH, priority=0):
+        submission = Submission(tasks, task_class=task_class, priority=priority)
+        with self._lock:
+            finished = [s for s in self.submissions.values() if s.finished]
+            for old in finished[:max(0, len(finished) - self.keep_finished)]:
+                del self.submissions[old.id]
+            self.submissions[submission.id] = submission
+        submission.emit("state", state=Submission.QUEUED, id=submission.id, position=self._position(submission))
+        self.pending.put((submission.rank, next(self._seq), submission))
+        return submission
+
+    def _position(self, submission):
+        with self.pending.mutex:
+            return sum(1 for rank, _, queued in self.pending.queue if queued is not None and rank <= submission.rank)
+
+    def _more_urgent_waiting(self, submission):
+        """Whether an interactive submission is waiting while a batch one runs, which should then yield.
+
+        Priority only orders the queue; it never preempts, so a long batch job is not
+        interrupted again and again by batch submissions of slightly higher priority.
+        """
+        running = class_rank(submission.task_class)
+        with self.pending.mutex:
+            return any(queued is not None and not queued.finished and class_rank(queued.task_class) < running
+                       for _, _, queued in self.pending.queue)
+
+    def cancel(self, submission_id):
+        submission = self.submissions.get(submission_id)
+        if submission is None:
+            return False
+        if submission.cancel_token is not None:
+            submission.cancel_token.cancel("cancelled by client")
+        elif not submission.finished:
+            submission.finish(Submission.CANCELLED)
+        return True
+
+    def status(self):
+        current = self.current
+        return {
+            "agents": sorted(self.agents or {}),
+            "config_file": self.config_file,
+            "config_loaded": self.config_mtime,
+            "queued": sum(1 for s in self.submissions.values() if s.state == Submission.QUEUED),
+            "running": current.id if current else None,
+            "submissions": len(self.submissions)
+        }
+
+    def _run(self):
+        while not self.cancel_token.is_set():
+            try:
+                _, _, submission = self.pending.get(timeout=1.0)
+            except queue.Empty:
+                submission = None
+            force, self._reload_requested = self._reload_requested, False
+            try:
+                self.reload(force=force)
+            except Exception as e:
+                print(f"Keeping the current agents; reloading {self.config_file} failed: {e}")
+            if submission is None or submission.finished:
+                continue
+            # Nothing may stop this thread, or later submissions would be accepted and never run
+            try:
+                self._execute(submission)
+            except Exception as e:
+                print(f"Submission {submission.id} failed: {e}")
+                self.current = None
+                if not submission.finished:
+                    submission.finish(Submission.FAILED)
+
+    def _execute(self, submission):
+        agents = self.agents
+        token = self.cancel_token.child()
+        submission.cancel_token = token
+        self.current = submission
+        self._output.submission = submission
+        state, run_started = Submission.DONE, False
+        try:
+            if submission.run_id is None:
+                submission.run_id = self.journal.start_run()
+                submission.started = time.time()
+            else:
+                self.journal.start_run(resume=True, run_id=submission.run_id)  # Continue after being preempted
+            run_started = True
+            for agent in agents.values():
+                agent.run_id = submission.run_id
+                agent.cancel_token = token
+            submission.state = Submission.RUNNING
+            submission.emit("state", state=Submission.RUNNING, run_id=submission.run_id)
+            preempted = self._run_tasks(agents, submission.tasks, self.journal, token, start=submission.started,
+                                        preempt=lambda: self._more_urgent_waiting(submission))
+            if token.is_set():
+                state = Submission.CANCELLED
+            elif preempted:
+                state = Submission.PREEMPTED
+        except Exception as e:
+            print(f"Submission {submission.id} failed: {e}")
+            state = Submission.FAILED
+        finally:
+            self._output.submission = None
+            self.current = None
+        # task_states still belongs to the previous run if this one could not be started
+        results = {f"{agent}:{task_id}": event["state"]
+                   for (agent, task_id), event in self.journal.task_states.items()} if run_started else {}
+        if state == Submission.PREEMPTED:
+            self._requeue(submission, results)
+        else:
+            submission.finish(state, results)
+
+    def _requeue(self, submission, results):
+        """Put a preempted submission back on the queue; it resumes its run, skipping completed tasks."""
+        submission.results = results
+        submission.cancel_token = None
+        submission.state = Submission.QUEUED
+        remaining = len(submission.tasks) - sum(1 for state in results.values() if state == RunJournal.COMPLETED)
+        submission.emit("state", state=Submission.PREEMPTED, run_id=submission.run_id, remaining=remaining)
+        self.pending.put((submission.rank, next(self._seq), submission))
+
+
+class DaemonRequestHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body=None):
+        data = json.dumps(body).encode("utf-8") if body is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream(self, submission, since=0):
+        """Write events as NDJSON until the submission finishes; the connection closes at the end."""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        seq = since
+        try:
+            while True:
+                events = submission.events_since(seq)
+                for event in events:
+                    self.wfile.write((json.dumps(event) + "\n").encode("utf-8"))
+                self.wfile.flush()
+                seq += len(events)
+                if submission.finished and seq >= len(submission.events):
+                    break
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # Client went away; the submission keeps running
+
+    def _submission(self, parts):
+        submission = self.server.agent_daemon.submissions.get(parts[1])
+        if submission is None:
+            self._reply(404, {"error": f"unknown submission {parts[1]}"})
+        return submission
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = url.path.strip("/").split("/")
+        query = parse_qs(url.query)
+        if parts == ["status"]:
+            self._reply(200, self.server.agent_daemon.status())
+        elif len(parts) == 2 and parts[0] == "submissions":
+            submission = self._submission(parts)
+            if submission:
+                self._reply(200, submission.summary())
+        elif len(parts) == 3 and parts[0] == "submissions" and parts[2] == "events":
+            submission = self._submission(parts)
+            if submission:
+                self._stream(submission, since=int(query.get("since", ["0"])[0]))
+        else:
+            self._reply(404, {"error": "not found"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        parts = url.path.strip("/").split("/")
+        query = parse_qs(url.query)
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            body = json.loads(self.rfile.read(length)) if length else {}
+        except json.JSONDecodeError:
+            self._reply(400, {"error": "body is not valid JSON"})
+            return
+        daemon = self.server.agent_daemon
+        if parts == ["submissions"]:
+            tasks = body.get("tasks") if isinstance(body, dict) else None
+            if not isinstance(tasks, list) or not all(
+                    isinstance(t, dict) and {"id", "description", "type"} <= set(t) for t in tasks):
+                self._reply(400, {"error": "expected {\"tasks\": [...]} with id, description and type on every task"})
+                return
+            task_class, priority = body.get("class", BATCH), body.get("priority", 0)
+            if task_class not in CLASS_RANK or not isinstance(priority, (int, float)):
+                self._reply(400, {"error": f"class must be one of {sorted(CLASS_RANK)} and priority a number"})
+                return
+            submission = daemon.submit(tasks, task_class=task_class, priority=priority)
+            if query.get("stream", ["0"])[0] not in ("", "0"):
+                self._stream(submission)
+            else:
+                self._reply(202, {"id": submission.id})
+        elif len(parts) == 3 and parts[0] == "submissions" and parts[2] == "cancel":
+            ok = daemon.cancel(parts[1])
+            self._reply(200 if ok else 404, {"ok": ok})
+        elif parts == ["reload"]:
+            daemon.request_reload()
+            self._reply(202, {"ok": True})
+        else:
+            self._reply(404, {"error": "not found"})
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        return request, ("local", 0)  # BaseHTTPRequestHandler expects a (host, port) address
+
+
+def serve_daemon(daemon, host="127.0.0.1", port=8766, socket_path=None):
+    """Create (but do not start) an HTTP server for the daemon, on a Unix socket if socket_path is set."""
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)  # Stale socket from a previous daemon
+        server = _UnixHTTPServer(socket_path, DaemonRequestHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), DaemonRequestHandler)
+        server.daemon_threads = True
+    server.agent_daemon = daemon
+    return server
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path, timeout=None):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class DaemonClient:
+    """Client for a daemon served by serve_daemon(); url is http://host:port or unix:///path/to/socket."""
+
+    def __init__(self, url=DEFAULT_DAEMON_URL, timeout=30):
+        self.url = url
+        self.timeout = timeout
+        parsed = urlparse(url)
+        if parsed.scheme == "unix":
+            self._connect = lambda timeout: _UnixHTTPConnection(parsed.path, timeout=timeout)
+        else:
+            self._connect = lambda timeout: http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=timeout)
+
+    def _request(self, method, path, body=None, timeout=None):
+        connection = self._connect(timeout)
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        headers = {"Content-Type": "application/json"} if data is not None else {}
+        connection.request(method, path, body=data, headers=headers)
+        response = connection.getresponse()
+        if response.status >= 400:
+            detail = response.read().decode("utf-8", "replace")
+            connection.close()
+            raise DaemonError(f"{method} {path} failed with {response.status}: {detail}")
+        return connection, response
+
+    def _json(self, method, path, body=None):
+        connection, response = self._request(method, path, body, timeout=self.timeout)
+        try:
+            return json.loads(response.read() or b"null")
+        finally:
+            connection.close()
+
+    def _events(self, connection, response):
+        try:
+            for line in response:
+                if line.strip():
+                    yield json.loads(line)
+        finally:
+            connection.close()
+
+    def submit(self, tasks, task_class=BATCH, priority=0):
+        return self._json("POST", "/submissions", {"tasks": tasks, "class": task_class, "priority": priority})["id"]
+
+    def submit_and_stream(self, tasks, task_class=BATCH, priority=0):
+        """Submit tasks and yield their progress events until the submission finishes."""
+        body = {"tasks": tasks, "class": task_class, "priority": priority}
+        return self._events(*self._request("POST", "/submissions?stream=1", body))
+
+    def events(self, submission_id, since=0):
+        return self._events(*self._request("GET", f"/submissions/{submission_id}/events?since={since}"))
+
+    def submission(self, submission_id):
+        return self._json("GET", f"/submissions/{submission_id}")
+
+    def cancel(self, submission_id):
+        return self._json("POST", f"/submissions/{submission_id}/cancel")["ok"]
+
+    def reload(self):
+        return self._json("POST", "/reload")
+
+    def status(self):
+        return self._json("GET", "/status")
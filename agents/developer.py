@@ -1,61 +1,267 @@
 from .base import BaseAgent
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import ast
 import os
 import re
+from .extract import extract_code, definitions_source, strip_think
+from .artifacts import ArtifactStore
+from .cancel import CancelToken
+from . import trace
+
+# Line that starts each task's section in a packed reply
+PACK_DELIMITER = re.compile(r"^[ \t]*#{3}[ \t]*TASK[ \t]+(\S+?)[ \t:]*$", re.MULTILINE | re.IGNORECASE)
+
 
 class DeveloperAgent(BaseAgent):
-    def __init__(self, name, role, skills, description, specialization, project_dir):
+    system_prompt = (
+        "You are a Python developer on a small team building an application one function at a time. "
+        "When asked for a function, provide only the function code, no additional explanations or comments."
+    )
+
+    def __init__(self, name, role, skills, description, specialization, project_dir,
+                 speculative_k=1, speculative_cancel="first_valid", pack_size=1):
         super().__init__(name, role, skills, description, project_dir)
         self.specialization = specialization
         self.src_dir = os.path.join(project_dir, "src")
         os.makedirs(self.src_dir, exist_ok=True)
+        self.artifacts = ArtifactStore(project_dir)
+        self.run_id = None  # Set by the orchestrator so artifacts can be traced to a run
+        # Speculative mode: race k generations per task and return the first that passes
+        # validation; "first_valid" cancels the rest, "none" lets them finish in the background.
+        self.speculative_k = max(1, speculative_k)
+        self.speculative_cancel = speculative_cancel
+        self.semantic_cache = None  # Shared SemanticCache when enabled in config/agents.json
+        # Packing: up to pack_size queued code tasks are answered by one model call; see pack()
+        self.pack_size = max(1, pack_size)
+        self.packed = {}  # task id -> (task, validated code or None, reused from cache) prepared by pack()
 
     def perform_task(self, task):
-        """Generate code using the local AI model."""
+        """Generate code using the local AI model. Returns the list of files written, or None on failure."""
         print(f"{self.name} (Role: {self.role}) working on task: {task['description']} ({self.description})")
         
         function_name = task.get("function_name", "example_function")
-        return_value = task.get("return_value", "")
-        prompt = (
-            f"Generate a Python function named '{function_name}' that returns the string '{return_value}'. "
-            f"The function should be simple and focused on the task: {task['description']}. "
-            "Provide only the function code, no additional explanations or comments."
-        )
-        
-        # Call the local model
-        code = self.call_local_model(prompt)
-        if not code:
-            print(f"{self.name} failed to generate code for task {task['description']}")
-            return
+        with trace.span("prompt_build", self.name):
+            prompt = self.build_prompt(task)
         
-        # Filter out <think> tags and non-Python code
-        code = re.sub(r'<think>[\s\S]*?</think>', '', code, flags=re.IGNORECASE)
-        # Extract only Python function/class definitions and related code
-        code_blocks = re.findall(r'((?:def |class )[\s\S]+?)(?=^def |^class |\Z)', code, flags=re.MULTILINE)
-        filtered_code = '\n\n'.join(block.strip() for block in code_blocks if block.strip())
+        # Use code prepared for this task by pack(), or reuse validated code from an
+        # earlier task with a near-identical spec
+        packed_task, filtered_code, reused = self.packed.pop(task["id"], (None, None, False))
+        if packed_task != task:
+            filtered_code, reused = None, False  # Packed for a different task with the same id
+        elif filtered_code is not None and not reused:
+            print(f"{self.name} using code from a packed request")
+        if filtered_code is None and self.semantic_cache and packed_task is None:
+            filtered_code = self.reuse_cached(task, function_name)
+            reused = filtered_code is not None
+        valid = filtered_code is not None
+        think = True
+
+        # Call the local model, thinking only if the reasoning policy asks for it; a fast
+        # answer that fails validation is retried once with thinking enabled
+        if not valid:
+            think = self.reasoning.should_think(task)
+            filtered_code = self.generate(prompt, function_name, think)
+            valid = bool(filtered_code) and self.validate_code(filtered_code, function_name)
+            self.reasoning.record(valid)
+        if not valid and not think:
+            print(f"{self.name} escalating to thinking mode for task {task['description']}")
+            escalated = self.generate(prompt, function_name, True)
+            valid = bool(escalated) and self.validate_code(escalated, function_name)
+            if valid:
+                filtered_code = escalated
+            else:
+                filtered_code = filtered_code or escalated
         if not filtered_code:
-            # Fallback: if nothing matched, just try to extract code-like lines
-            filtered_code = '\n'.join(line for line in code.splitlines() if line.strip() and not line.strip().startswith('#'))
+            print(f"{self.name} failed to generate code for task {task['description']}")
+            return None
         
-        # Write the filtered code to file
-        output_file = os.path.join(self.src_dir, f"{function_name}_{self.name}.py")
-        with open(output_file, "w") as f:
-            f.write(f"# Task: {task['description']}\n")
-            f.write(f"# Generated by {self.name} ({self.description})\n")
-            f.write(filtered_code.strip() + "\n")
+        # Store the filtered code by content hash and link it into src/
+        file_name = f"{function_name}_{self.name}.py"
+        content = (
+            f"# Task: {task['description']}\n"
+            f"# Generated by {self.name} ({self.description})\n"
+            + filtered_code.strip() + "\n"
+        )
+        with trace.span("file_write", self.name):
+            sha = self.artifacts.put(content)
+            self.artifacts.record(sha, file_name, task["id"], self.name, run_id=self.run_id)
+            output_file = self.artifacts.materialize(sha, os.path.join(self.src_dir, file_name))
+        if valid and not reused and self.semantic_cache:
+            self.semantic_cache.add(task, sha, agent=self.name)
 
         self.coordinate(task)
+        return [output_file]
+
+    def reuse_cached(self, task, function_name):
+        """Code from the most similar cached artifact with the same spec that still validates, or None."""
+        with trace.span("cache_lookup", self.name):
+            spec = self.semantic_cache.spec_fields(task)
+            for score, entry in self.semantic_cache.lookup(task):
+                if entry.get("spec") != spec:
+                    continue  # Similar wording, but e.g. a different return value
+                try:
+                    code = definitions_source(extract_code(self.artifacts.read(entry["sha"])))
+                except OSError:
+                    continue  # Artifact no longer in the store
+                if self.validate_code(code, function_name):
+                    print(f"{self.name} reusing code from task {entry['task_id']} ({entry['description']}), "
+                          f"similarity {score:.3f}")
+                    return code
+        return None
+
+    def pack(self, tasks):
+        """Generate code for several queued code tasks with one model call.
+
+        The tasks that would run with the same reasoning mode as the first are put in one
+        prompt asking for a "### TASK <id>" delimited section per task. Each section is
+        validated on its own and kept in self.packed for perform_task. A task whose
+        section is missing or invalid is recorded without code, so it is generated alone
+        rather than packed again. Tasks the semantic cache can serve are not packed.
+        Returns the number of tasks packed.
+        """
+        tasks = [t for t in tasks if t["type"] == "code" and t["id"] not in self.packed]
+        if self.semantic_cache:
+            for task in list(tasks):
+                code = self.reuse_cached(task, task.get("function_name", "example_function"))
+                if code is not None:
+                    self.packed[task["id"]] = (task, code, True)
+                    tasks.remove(task)
+        if len(tasks) < 2:
+            return 0
+        think = self.reasoning.should_think(tasks[0])
+        tasks = [t for t in tasks if self.reasoning.should_think(t) == think][:self.pack_limit(think)]
+        if len(tasks) < 2:
+            return 0
+        with trace.span("prompt_build", self.name):
+            prompt = self.build_packed_prompt(tasks)
+        print(f"{self.name} packing {len(tasks)} tasks into one request: {', '.join(str(t['id']) for t in tasks)}")
+        reply = self.call_local_model(prompt, think=think, tasks=len(tasks))
+        with trace.span("extract", self.name):
+            sections = self.split_packed_reply(reply) if reply else {}
+        packed = 0
+        for task in tasks:
+            code = self.extract_code(sections.get(str(task["id"]), ""))
+            valid = bool(code) and self.validate_code(code, task.get("function_name", "example_function"))
+            self.packed[task["id"]] = (task, code if valid else None, False)
+            if valid:
+                packed += 1
+            else:
+                print(f"{self.name} packed reply had no valid code for task {task['id']}; it will be generated alone")
+        # One call, one outcome for the reasoning policy: a partly bad reply is one failure, not several
+        self.reasoning.record(packed == len(tasks))
+        return packed
+
+    def pack_limit(self, think):
+        """How many tasks fit in one packed call: at most pack_size, and few enough that
+        their combined generation budget takes no more than half the context window."""
+        options = self.call_options(think)
+        num_predict, num_ctx = options.get("num_predict", 0), options.get("num_ctx", 0)
+        if num_predict <= 0 or not num_ctx:
+            return self.pack_size
+        return max(1, min(self.pack_size, num_ctx // 2 // num_predict))
+
+    @classmethod
+    def build_packed_prompt(cls, tasks):
+        """One prompt covering several tasks, asking for a delimited section per task."""
+        lines = [
+            f"Complete the following {len(tasks)} tasks. For each task, write a line '### TASK <id>' "
+            "followed by only the code for that task. Do not combine tasks or add anything else.",
+            ""
+        ]
+        for task in tasks:
+            lines.append(f"### TASK {task['id']}")
+            lines.append(cls.build_prompt(task))
+        return "\n".join(lines)
+
+    @staticmethod
+    def split_packed_reply(reply):
+        """Map each task id in a packed reply to the text of its section."""
+        reply = strip_think(reply)  # "### TASK" lines in the reasoning are not sections
+        matches = list(PACK_DELIMITER.finditer(reply))
+        return {
+            match.group(1): reply[match.end():matches[i + 1].start() if i + 1 < len(matches) else len(reply)]
+            for i, match in enumerate(matches)
+        }
+
+    def generate(self, prompt, function_name, think):
+        """One generation (or speculative race) for a prompt; returns the extracted code or None."""
+        if self.speculative_k > 1:
+            return self.generate_speculative(prompt, function_name, think)
+        code = self.call_local_model(prompt, think=think)
+        with trace.span("extract", self.name):
+            return self.extract_code(code) if code else None
+
+    @staticmethod
+    def build_prompt(task):
+        """The per-task part of the prompt; role instructions live in system_prompt."""
+        function_name = task.get("function_name", "example_function")
+        return_value = task.get("return_value", "")
+        return (
+            f"Generate a Python function named '{function_name}' that returns the string '{return_value}'. "
+            f"The function should be simple and focused on the task: {task['description']}."
+        )
+
+    def extract_code(self, code):
+        """Strip reasoning and prose from a model reply, keeping the Python definitions."""
+        return definitions_source(extract_code(code))
+
+    def validate_code(self, code, function_name):
+        """True if the code parses and defines the requested function."""
+        try:
+            tree = ast.parse(code)
+        except SyntaxError:
+            return False
+        return any(isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name == function_name
+                   for node in tree.body)
+
+    def generate_speculative(self, prompt, function_name, think=True):
+        """Race speculative_k generations with different seeds/temperatures; return the first valid one.
+
+        If no candidate validates, the first non-empty one is returned so behaviour matches
+        the single-generation path.
+        """
+        prompt = f"{prompt} {self.reasoning.suffix(think)}"
+        messages = self.build_messages(prompt)
+        cancel_event = self.cancel_token.child() if self.cancel_token else CancelToken()
+        candidate_options = [
+            dict(self.call_options(think), seed=i, temperature=round(min(0.2 + 0.3 * i, 1.2), 2))
+            for i in range(self.speculative_k)
+        ]
+        winner, winner_reply, fallback = None, None, None
+        # Not a with-block: leaving one waits for every candidate, and the winner is
+        # returned as soon as it validates while "none" lets the others finish unobserved
+        pool = ThreadPoolExecutor(max_workers=self.speculative_k)
+        try:
+            with trace.span("llm_wait", self.name):
+                futures = [pool.submit(self.llm.chat, messages, options, cancel_event) for options in candidate_options]
+                for i, future in enumerate(as_completed(futures)):
+                    reply = future.result()
+                    if not reply:
+                        continue
+                    code = self.extract_code(reply)
+                    if self.validate_code(code, function_name):
+                        winner, winner_reply = code, reply
+                        print(f"{self.name} accepted a speculative candidate after {i+1} of {self.speculative_k} replies")
+                        if self.speculative_cancel == "first_valid":
+                            cancel_event.cancel()
+                        break
+                    if fallback is None and code:
+                        fallback = (code, reply)
+        finally:
+            pool.shutdown(wait=False)
+        if winner is None and fallback:
+            winner, winner_reply = fallback
+        if winner and self.session:
+            self.session.add_turn(prompt, winner_reply)
+        return winner
 
     def coordinate(self, task):
         """Check compatibility with other developers."""
-        messages = self.receive_messages()
-        for msg in messages:
-            if msg["sender"] != self.name:
-                print(f"{self.name} received coordination message from {msg['sender']}: {msg['message']}")
+        for msg in self.receive_topic_messages():
+            print(f"{self.name} received coordination message from {msg['sender']}: {msg['message']}")
         
         coordination_msg = {
             "task_id": task["id"],
             "description": f"{self.name} completed {task['description']}. Check compatibility."
         }
-        self.send_message("Dev1", coordination_msg)
-        self.send_message("Dev2", coordination_msg)
-        self.send_message("Tester1", coordination_msg)  # Notify tester
+        self.publish("coordination", coordination_msg)
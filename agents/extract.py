@@ -0,0 +1,196 @@
+import ast
+import re
+from collections import namedtuple
+
+# A validated piece of Python recovered from a model reply.
+#   source: the code text
+#   names:  top-level names it defines (functions, classes, assignments, imports)
+#   kind:   "definitions" if it only defines things, "script" if it also runs statements
+#   fenced: True if it came from a ``` fenced block
+CodeBlock = namedtuple("CodeBlock", ["source", "names", "kind", "fenced"])
+
+PYTHON_FENCE_LANGUAGES = ("", "python", "py", "python3")
+DEFINITION_NODES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Import, ast.ImportFrom)
+_THINK_TAG = re.compile(r"</?think>", re.IGNORECASE)
+_BLOCK_START = re.compile(r"(?:async\s+(?:def|for|with)|def|class|from|import|if|for|while|with|try)\b|@")
+_BLOCK_CONTINUE = re.compile(r"(?:elif|else|except|finally)\b")  # Unindented clauses that continue a compound block
+
+
+class CodeExtractor:
+    """Single-pass, streaming extractor for Python code in model output.
+
+    Text can be fed in arbitrary chunks (for example as tokens arrive). Each line is
+    looked at once: <think> sections are dropped, ``` fenced blocks are collected, and
+    everything else is kept as loose text for the unfenced fallback. close() validates
+    the candidates with ast and returns a list of CodeBlock.
+    """
+
+    def __init__(self):
+        self._pending = []  # Pieces of the current, not yet terminated line
+        self._in_think = False
+        self._fence = None  # Lines of the fenced block being read, or None
+        self._fence_lang = ""
+        self._fenced = []
+        self._loose = []
+
+    def feed(self, chunk):
+        self._pending.append(chunk)
+        if "\n" not in chunk:
+            return
+        lines = "".join(self._pending).split("\n")
+        self._pending = [lines.pop()]
+        for line in lines:
+            self._line(line)
+
+    def _strip_think(self, line):
+        if "<" not in line and not self._in_think:
+            return line
+        kept = []
+        pos = 0
+        for match in _THINK_TAG.finditer(line):
+            if not self._in_think:
+                kept.append(line[pos:match.start()])
+            self._in_think = not match.group(0).startswith("</")
+            pos = match.end()
+        if not self._in_think:
+            kept.append(line[pos:])
+        return "".join(kept)
+
+    def _line(self, line):
+        had_think = self._in_think or "<" in line
+        line = self._strip_think(line)
+        if self._in_think and not line.strip():
+            return
+        stripped = line.strip()
+        if stripped.startswith("```"):
+            if self._fence is None:
+                self._fence = []
+                self._fence_lang = stripped[3:].strip().lower()
+            else:
+                if self._fence_lang in PYTHON_FENCE_LANGUAGES:
+                    self._fenced.append("\n".join(self._fence))
+                self._fence = None
+            return
+        if self._fence is not None:
+            self._fence.append(line)
+        elif stripped or not had_think:
+            self._loose.append(line)
+
+    def close(self):
+        """Flush buffered text and return the validated CodeBlocks, fenced blocks first."""
+        if self._pending:
+            self._line("".join(self._pending))
+            self._pending = []
+        if self._fence is not None and self._fence_lang in PYTHON_FENCE_LANGUAGES:
+            self._fenced.append("\n".join(self._fence))  # Unterminated fence at end of output
+            self._fence = None
+        blocks = []
+        for source in self._fenced:
+            block = _validate(source, fenced=True)
+            if block:
+                blocks.append(block)
+            else:
+                # A fenced block that does not parse as a whole may still hold valid definitions
+                blocks.extend(_split_loose(source.split("\n"), fenced=True))
+        if not blocks:
+            blocks = _split_loose(self._loose, fenced=False)
+        return blocks
+
+
+def _validate(source, fenced):
+    source = source.strip("\n")
+    if not source.strip():
+        return None
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        return None
+    names = []
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.append(node.name)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            names.extend((alias.asname or alias.name).split(".")[0] for alias in node.names)
+        elif isinstance(node, ast.Assign):
+            names.extend(t.id for t in node.targets if isinstance(t, ast.Name))
+    kind = "definitions" if all(isinstance(node, DEFINITION_NODES) for node in tree.body) else "script"
+    return CodeBlock(source, names, kind, fenced)
+
+
+def _is_statement(line):
+    """True if a single unindented line parses as a meaningful Python statement (not prose)."""
+    try:
+        tree = ast.parse(line)
+    except SyntaxError:
+        return False
+    # Single words of prose ("Done", "Explanation") parse as bare names or constants
+    return bool(tree.body) and not all(
+        isinstance(node, ast.Expr) and isinstance(node.value, (ast.Name, ast.Constant)) for node in tree.body
+    )
+
+
+def _split_loose(lines, fenced):
+    """Recover code from text that is not one valid module.
+
+    Top-level def/class/import and compound statement (if/for/while/with/try) blocks
+    run until the next unindented line that does not continue them; other unindented
+    lines are kept when they parse on their own as statements.
+    """
+    blocks = []
+    current = None
+    for line in lines + ["#"]:  # Unindented sentinel closes a trailing block
+        if current is not None:
+            if (not line.strip() or line[:1] in (" ", "\t") or _BLOCK_CONTINUE.match(line)
+                    or (current[-1].lstrip().startswith("@") and line.strip())):
+                current.append(line)
+                continue
+            block = _validate("\n".join(current), fenced)
+            if block:
+                blocks.append(block)
+            current = None
+        stripped = line.strip()
+        if not stripped or line[:1] in (" ", "\t"):
+            continue
+        if _BLOCK_START.match(stripped):
+            current = [line]
+        elif _is_statement(stripped):
+            block = _validate(stripped, fenced)
+            if block:
+                blocks.append(block)
+    return blocks
+
+
+def extract_code(text):
+    """Extract validated CodeBlocks from a complete model reply."""
+    extractor = CodeExtractor()
+    extractor.feed(text)
+    return extractor.close()
+
+
+def strip_think(text):
+    """Text with its <think> sections removed, including one left unclosed by a truncated reply."""
+    extractor = CodeExtractor()
+    kept = []
+    for line in text.split("\n"):
+        had_think = extractor._in_think or "<" in line
+        line = extractor._strip_think(line)
+        if line.strip() or not had_think:
+            kept.append(line)
+    return "\n".join(kept)
+
+
+def definitions_source(blocks):
+    """Join only the top-level definitions (with decorators) and imports from the blocks."""
+    parts = []
+    for block in blocks:
+        lines = block.source.split("\n")
+        for node in ast.parse(block.source).body:
+            if isinstance(node, DEFINITION_NODES):
+                start = min([node.lineno] + [d.lineno for d in getattr(node, "decorator_list", [])])
+                parts.append("\n".join(lines[start - 1:node.end_lineno]))
+    return "\n\n".join(parts)
+
+
+def script_source(blocks):
+    """Join all recovered code in order, for replies that are meant to be run as a script."""
+    return "\n".join(block.source for block in blocks)
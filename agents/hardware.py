@@ -0,0 +1,178 @@
+import glob
+import json
+import os
+import subprocess
+import time
+from . import configedit
+from .llm import LocalModelClient, DEFAULT_MODEL
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+_hardware = None
+
+
+def has_nvidia_gpu():
+    try:
+        subprocess.check_output(['nvidia-smi'])
+        return True
+    except Exception:
+        return False
+
+
+def has_amd_gpu():
+    try:
+        subprocess.check_output(['rocm-smi'])
+        return True
+    except Exception:
+        return False
+
+
+def _physical_cores():
+    if psutil is not None:
+        return psutil.cpu_count(logical=False)
+    # Count distinct (physical id, core id) pairs in /proc/cpuinfo
+    cores, physical_id = set(), None
+    try:
+        with open("/proc/cpuinfo", "r") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                key = key.strip()
+                if key == "physical id":
+                    physical_id = value.strip()
+                elif key == "core id":
+                    cores.add((physical_id, value.strip()))
+    except OSError:
+        return None
+    return len(cores) or None
+
+
+def _total_ram():
+    if psutil is not None:
+        return psutil.virtual_memory().total
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def detect_hardware(refresh=False):
+    """Cores, NUMA nodes, RAM and GPU of this host; probed once per process."""
+    global _hardware
+    if _hardware is None or refresh:
+        logical = os.cpu_count() or 1
+        gpu = "nvidia" if has_nvidia_gpu() else "amd" if has_amd_gpu() else None
+        _hardware = {
+            "logical_cores": logical,
+            "physical_cores": _physical_cores() or logical,
+            "numa_nodes": len(glob.glob("/sys/devices/system/node/node[0-9]*")) or 1,
+            "ram_bytes": _total_ram(),
+            "gpu": gpu
+        }
+    return _hardware
+
+
+def inference_profile(hardware):
+    """Ollama options suited to the host.
+
+    CPU threads are limited to the physical cores of one NUMA node, since hyperthreads
+    and cross-node memory traffic slow token generation down. With a GPU all layers
+    are offloaded and a larger batch speeds up prompt evaluation. The context window
+    is sized to the RAM available for the KV cache.
+    """
+    threads = max(1, hardware["physical_cores"] // hardware["numa_nodes"])
+    ram_gb = (hardware["ram_bytes"] or 0) / 2 ** 30
+    profile = {"num_thread": threads}
+    if hardware["gpu"]:
+        profile["num_gpu"] = -1  # Offload all layers to the GPU
+        profile["num_batch"] = 1024
+    else:
+        profile["num_batch"] = 512 if ram_gb >= 16 else 256
+    if ram_gb and ram_gb < 8:
+        profile["num_ctx"] = 2048
+    elif ram_gb and ram_gb < 32:
+        profile["num_ctx"] = 4096
+    else:
+        profile["num_ctx"] = 8192
+    return profile
+
+
+def describe(hardware):
+    ram = f"{hardware['ram_bytes'] / 2 ** 30:.1f} GiB RAM" if hardware["ram_bytes"] else "unknown RAM"
+    return (f"{hardware['physical_cores']} physical / {hardware['logical_cores']} logical cores, "
+            f"{hardware['numa_nodes']} NUMA node(s), {ram}, GPU: {hardware['gpu'] or 'none'}")
+
+
+CALIBRATION_PROMPT = "Write a Python function that returns the string 'Hello'. Provide only the code. /no_think"
+
+
+def set_profile(text, **values):
+    """Set keys of the top-level "profile" in a config file's text, leaving the rest of its layout alone."""
+    top = configedit.root(text)
+    profile = configedit.value_start(text, top, "profile")
+    if profile is None:
+        return configedit.set_member(text, top, "profile", values)
+    for key, value in values.items():
+        text = configedit.set_member(text, profile, key, value)
+    return text
+
+
+def calibrate(project_dir, config_file, model=None, threads=None, batches=None, repeat=2, apply=False):
+    """Measure generation speed for num_thread/num_batch combinations and pick the fastest.
+
+    Each combination gets one warm-up call (Ollama reloads the model when these options
+    change) and then repeat timed calls. Results go to project/calibration.json; with
+    apply=True the winner is written to the top-level "profile" in config_file.
+    """
+    hardware = detect_hardware()
+    base = inference_profile(hardware)
+    physical, logical = hardware["physical_cores"], hardware["logical_cores"]
+    threads = threads or sorted({max(1, physical // 2), base["num_thread"], physical, logical})
+    batches = batches or ([128, 256, 512, 1024] if hardware["gpu"] else [128, 256, 512])
+    client = LocalModelClient("Calibrate", model=model or DEFAULT_MODEL, max_retries=1)
+    messages = [{"role": "user", "content": CALIBRATION_PROMPT}]
+    print(f"Calibrating on {describe(hardware)}")
+
+    results = []
+    for num_thread in threads:
+        for num_batch in batches:
+            options = dict(base, num_thread=num_thread, num_batch=num_batch, num_predict=64)
+            client.chat(messages, options=options)  # Warm-up / model reload
+            rates, prompt_rates = [], []
+            for _ in range(repeat):
+                if client.chat(messages, options=options) is None:
+                    continue
+                stats = client.last_stats
+                if stats.get("eval_duration"):
+                    rates.append(stats["eval_count"] / (stats["eval_duration"] / 1e9))
+                if stats.get("prompt_eval_duration"):
+                    prompt_rates.append(stats["prompt_eval_count"] / (stats["prompt_eval_duration"] / 1e9))
+            result = {
+                "num_thread": num_thread,
+                "num_batch": num_batch,
+                "tokens_per_s": sum(rates) / len(rates) if rates else None,
+                "prompt_tokens_per_s": sum(prompt_rates) / len(prompt_rates) if prompt_rates else None
+            }
+            results.append(result)
+            rate = f"{result['tokens_per_s']:.1f}" if result["tokens_per_s"] is not None else "n/a"
+            print(f"  num_thread {num_thread:>3}  num_batch {num_batch:>5}  tok/s {rate:>7}")
+
+    measured = [r for r in results if r["tokens_per_s"] is not None]
+    best = max(measured, key=lambda r: (r["tokens_per_s"], r["prompt_tokens_per_s"] or 0)) if measured else None
+    report_path = os.path.join(project_dir, "calibration.json")
+    with open(report_path, "w") as f:
+        json.dump({"ts": time.time(), "hardware": hardware, "results": results, "best": best}, f, indent=2)
+    print(f"Calibration results written to {report_path}")
+    if best is None:
+        print("No measurements succeeded; is the model server running?")
+        return None
+    print(f"Fastest: num_thread {best['num_thread']}, num_batch {best['num_batch']} ({best['tokens_per_s']:.1f} tok/s)")
+
+    if apply:
+        with open(config_file, "r") as f:
+            text = f.read()
+        with open(config_file, "w") as f:
+            f.write(set_profile(text, num_thread=best["num_thread"], num_batch=best["num_batch"]))
+        print(f"Updated the inference profile in {config_file}")
+    return best
@@ -0,0 +1,106 @@
+import hashlib
+import json
+import os
+import time
+import uuid
+
+
+def file_sha256(path):
+    """Return the hex sha256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class RunJournal:
+    """Append-only journal of task state transitions, used to resume interrupted runs.
+
+    Each line is a JSON event. Events are flushed and fsync'd as they are written so a
+    crash loses at most the event being written; a torn trailing line is ignored on load.
+    """
+
+    STARTED = "started"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+    def __init__(self, project_dir, filename="journal.jsonl"):
+        self.project_dir = project_dir
+        self.path = os.path.join(project_dir, filename)
+        self.run_id = None
+        self.task_states = {}  # (agent, task_id) -> last task event of the current run
+        self.listeners = []  # Called as listener(agent, task_id, state) after each task event
+
+    def _load_events(self):
+        events = []
+        if not os.path.exists(self.path):
+            return events
+        with open(self.path, "r") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    events.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue  # Torn write from a crash
+        return events
+
+    def _append(self, event):
+        event["ts"] = time.time()
+        event["run_id"] = self.run_id
+        with open(self.path, "a") as f:
+            f.write(json.dumps(event) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def start_run(self, resume=False, run_id=None):
+        """Start a new run, or continue run_id (by default the most recent run) when resume is True."""
+        if resume:
+            events = self._load_events()
+            runs = [e["run_id"] for e in events if e.get("event") == "run_start"]
+            if run_id is not None and run_id not in runs:
+                print(f"Run {run_id} not found in journal; starting a new run.")
+                runs = []
+            if runs:
+                self.run_id = run_id or runs[-1]
+                self.task_states = {}
+                for e in events:
+                    if e.get("run_id") == self.run_id and e.get("event") == "task":
+                        self.task_states[(e["agent"], e["task_id"])] = e
+                self._append({"event": "run_resume"})
+                return self.run_id
+            print("No previous run found in journal; starting a new run.")
+        self.run_id = uuid.uuid4().hex[:12]
+        self.task_states = {}
+        self._append({"event": "run_start"})
+        return self.run_id
+
+    def record(self, agent, task_id, state, artifacts=None):
+        """Record a task state transition, hashing any artifact files produced."""
+        hashes = {}
+        for path in artifacts or []:
+            if os.path.exists(path):
+                hashes[os.path.relpath(path, self.project_dir)] = file_sha256(path)
+        event = {"event": "task", "agent": agent, "task_id": task_id, "state": state, "artifacts": hashes}
+        self._append(event)
+        self.task_states[(agent, task_id)] = event
+        for listener in self.listeners:
+            listener(agent, task_id, state)
+
+    def is_completed(self, agent, task_id):
+        """True if the task completed in this run and its artifacts are unchanged on disk."""
+        event = self.task_states.get((agent, task_id))
+        if not event or event["state"] != self.COMPLETED or not event["artifacts"]:
+            return False
+        for rel_path, sha in event["artifacts"].items():
+            path = os.path.join(self.project_dir, rel_path)
+            if not os.path.exists(path) or file_sha256(path) != sha:
+                return False
+        return True
+
+    def in_flight(self):
+        """Tasks that were started but never reached a final state in this run."""
+        return [key for key, e in self.task_states.items() if e["state"] == self.STARTED]
@@ -0,0 +1,239 @@
+import json
+import queue
+import re
+import threading
+import time
+import requests
+
+
+DEFAULT_MODEL = "qwen3-custom"
+STAT_FIELDS = ("prompt_eval_count", "prompt_eval_duration", "eval_count", "eval_duration", "total_duration")
+
+
+class LocalModelClient:
+    """Thin client for the local Ollama chat API with retries and timing stats."""
+
+    CANCEL_POLL = 0.1  # Seconds between cancellation checks while streaming
+    cassette = None  # Shared Cassette that records or replays every client's traffic; see agents/cassette.py
+
+    def __init__(self, name, model=DEFAULT_MODEL, api_url="http://localhost:11434/api/chat", timeout=120,
+                 max_retries=3, backoff=2, keep_alive=None):
+        self.name = name
+        self.model = model
+        self.api_url = api_url
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.keep_alive = keep_alive  # Top-level request field (not an option); -1 keeps the model loaded
+        self.calls = 0
+        self.stats = {field: 0 for field in STAT_FIELDS}
+        self.last_stats = {}
+        self._stats_lock = threading.Lock()
+
+    def chat(self, messages, options=None, cancel_event=None, on_token=None, model=None, on_stats=None):
+        """Send a chat request and return the reply text, or None after exhausting retries.
+
+        When cancel_event or on_token is given the reply is streamed: on_token is called
+        with each piece of text as it arrives, and the request is abandoned as soon as
+        cancel_event is set (None is returned in that case).
+        on_stats is called with this call's timing stats (see STAT_FIELDS) once it completes;
+        unlike last_stats they cannot belong to another thread's call.
+        With a replaying cassette the reply comes from the cassette instead of the server.
+        """
+        stream = cancel_event is not None or on_token is not None
+        payload = {
+            "model": model or self.model,
+            "messages": messages,
+            "stream": stream
+        }
+        if options:
+            payload["options"] = options
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        cassette = self.cassette
+        if cassette is not None and cassette.replaying:
+            return self._replay_chat(cassette, payload, options, cancel_event, on_token, on_stats)
+        retries = 0
+        while retries < self.max_retries:
+            if cancel_event is not None and cancel_event.is_set():
+                return None
+            try:
+                started = time.time()
+                if stream:
+                    reply, stats = self._stream_chat(payload, cancel_event, on_token)
+                else:
+                    response = requests.post(self.api_url, json=payload, timeout=self.timeout)
+                    response.raise_for_status()
+                    data = response.json()
+                    stats = self._record_stats(data)
+                    reply = data["message"]["content"]
+                if on_stats and reply is not None:
+                    on_stats(stats)
+                if cassette is not None and reply is not None:
+                    cassette.record("chat", payload["model"], cassette.chat_body(messages, options), reply,
+                                    stats, time.time() - started)
+                return reply
+            except requests.Timeout:
+                print(f"{self.name} API call timed out after {self.timeout} seconds. Retrying ({retries+1}/{self.max_retries})...")
+            except requests.ConnectionError as e:
+                print(f"{self.name} API connection error: {e}. Retrying ({retries+1}/{self.max_retries})...")
+            except requests.RequestException as e:
+                print(f"{self.name} API call failed: {e}. Retrying ({retries+1}/{self.max_retries})...")
+            delay = self.backoff * (2 ** retries)
+            if cancel_event is not None:
+                if cancel_event.wait(delay):
+                    return None
+            else:
+                time.sleep(delay)
+            retries += 1
+        print(f"{self.name} failed to get a response from the local model after {self.max_retries} attempts.")
+        return None
+
+    def list_models(self):
+        """Models installed on the server (the "models" list from /api/tags)."""
+        base_url = self.api_url.rsplit("/api/", 1)[0]
+        response = requests.get(f"{base_url}/api/tags", timeout=self.timeout)
+        response.raise_for_status()
+        return response.json().get("models", [])
+
+    def embed(self, texts, model=None):
+        """Embedding vectors for texts from the server's /api/embed endpoint."""
+        model = model or self.model
+        cassette = self.cassette
+        if cassette is not None and cassette.replaying:
+            entry = cassette.replay("embed", model, texts)
+            if entry is None:
+                raise requests.ConnectionError(f"{self.name}: embedding request not found in cassette {cassette.path}")
+            return entry["response"]
+        base_url = self.api_url.rsplit("/api/", 1)[0]
+        started = time.time()
+        response = requests.post(f"{base_url}/api/embed", json={"model": model, "input": texts}, timeout=self.timeout)
+        response.raise_for_status()
+        embeddings = response.json()["embeddings"]
+        if cassette is not None:
+            cassette.record("embed", model, texts, embeddings, latency=time.time() - started)
+        return embeddings
+
+    def _replay_chat(self, cassette, payload, options, cancel_event, on_token, on_stats):
+        entry = cassette.replay("chat", payload["model"], cassette.chat_body(payload["messages"], options),
+                                cancel_event=cancel_event)
+        if entry is None:
+            if cancel_event is None or not cancel_event.is_set():
+                print(f"{self.name} request not found in cassette {cassette.path}")
+            return None
+        if on_token and entry["response"]:
+            on_token(entry["response"])
+        stats = self._record_stats(entry["stats"])
+        if on_stats:
+            on_stats(stats)
+        return entry["response"]
+
+    def _stream_chat(self, payload, cancel_event, on_token):
+        # Returns (reply, stats of this call); reply is None if the call was cancelled.
+        # The HTTP read happens on a helper thread so a cancelled call returns within
+        # CANCEL_POLL seconds even while the server is still evaluating the prompt.
+        # The helper closes the connection at the next chunk, which stops generation.
+        chunks = queue.Queue()
+        abandoned = threading.Event()
+        timeout = self.timeout
+        if cancel_event is not None and hasattr(cancel_event, "remaining"):
+            timeout = max(0.1, min(timeout, cancel_event.remaining(timeout)))
+
+        def read():
+            try:
+                with requests.post(self.api_url, json=payload, timeout=timeout, stream=True) as response:
+                    response.raise_for_status()
+                    for line in response.iter_lines():
+                        if abandoned.is_set():
+                            return
+                        if line:
+                            try:
+                                chunks.put(("chunk", json.loads(line)))
+                            except ValueError as e:
+                                # A truncated chunk or a proxy error page; retried like a failed request
+                                raise requests.RequestException(f"invalid response line {line[:80]!r}: {e}")
+                chunks.put(("end", None))
+            except Exception as e:
+                chunks.put(("error", e))
+
+        threading.Thread(target=read, daemon=True).start()
+        parts = []
+        stats = {}
+        while True:
+            if cancel_event is not None and cancel_event.is_set():
+                abandoned.set()
+                return None, stats
+            try:
+                kind, chunk = chunks.get(timeout=self.CANCEL_POLL)
+            except queue.Empty:
+                continue
+            if kind == "error":
+                raise chunk
+            if kind == "end":
+                break
+            text = chunk.get("message", {}).get("content", "")
+            parts.append(text)
+            if on_token and text:
+                on_token(text)
+            if chunk.get("done"):
+                abandoned.set()
+                stats = self._record_stats(chunk)
+                break
+        return "".join(parts), stats
+
+    def _record_stats(self, data):
+        """Add one call's stats to the totals and return them.
+
+        last_stats is whichever call finished last; callers that may run concurrently
+        use the returned dict instead.
+        """
+        stats = {field: data.get(field, 0) for field in STAT_FIELDS}
+        with self._stats_lock:
+            self.calls += 1
+            self.last_stats = stats
+            for field, value in stats.items():
+                self.stats[field] += value
+        return stats
+
+    def summary(self):
+        """One-line summary of accumulated timings (durations are reported in ms)."""
+        if not self.calls:
+            return f"{self.name}: no model calls"
+        prompt_ms = self.stats["prompt_eval_duration"] / 1e6
+        return (f"{self.name}: {self.calls} call(s), {self.stats['prompt_eval_count']} prompt tokens, "
+                f"prompt_eval {prompt_ms:.0f} ms total ({prompt_ms / self.calls:.0f} ms/call), "
+                f"{self.stats['eval_count']} generated tokens")
+
+
+class ChatSession:
+    """Persistent conversation with a stable system prompt and bounded history.
+
+    The system prompt and retained turns are sent byte-identical on every call so the
+    model server can reuse its KV cache for the shared prefix. When the history grows
+    past max_turns (or max_chars), whole turns are dropped from the front.
+    """
+
+    def __init__(self, system_prompt, max_turns=4, max_chars=8000):
+        self.system_prompt = system_prompt
+        self.max_turns = max_turns
+        self.max_chars = max_chars
+        self.history = []
+
+    def build_messages(self, prompt):
+        messages = [{"role": "system", "content": self.system_prompt}] if self.system_prompt else []
+        return messages + self.history + [{"role": "user", "content": prompt}]
+
+    def add_turn(self, prompt, reply):
+        # Reasoning traces are not useful as context and would only grow the prompt
+        reply = re.sub(r'<think>[\s\S]*?</think>', '', reply, flags=re.IGNORECASE).strip()
+        self.history += [{"role": "user", "content": prompt}, {"role": "assistant", "content": reply}]
+        self._truncate()
+
+    def _truncate(self):
+        while len(self.history) > 2 * self.max_turns:
+            del self.history[:2]
+        while self.history and sum(len(m["content"]) for m in self.history) > self.max_chars:
+            del self.history[:2]
+
+    def reset(self):
+        self.history = []
@@ -1,4 +1,7 @@
 from .base import BaseAgent
+from .worker import task_queue
+from .progress import ProgressTracker, format_status
+from . import trace
 import json
 import os
 
@@ -6,7 +9,10 @@ class ManagerAgent(BaseAgent):
     def __init__(self, name, role, skills, description, project_dir, timeout=120):
         super().__init__(name, role, skills, description, project_dir, timeout=timeout)
         self.task_list = []
-        self.progress_report = []
+        self.run_id = None  # Set by the orchestrator; each run gets its own section in the report
+        self.report_file = os.path.join(project_dir, "progress_report.txt")
+        self.progress = ProgressTracker.shared(project_dir)
+        self._report_run = ""  # Run whose section the report file currently ends with
 
     def load_tasks(self, task_file):
         """Load tasks from a JSON file."""
@@ -17,29 +23,50 @@ class ManagerAgent(BaseAgent):
         """Assign a task to an agent."""
         self.send_message(agent, {"task": task})
         print(f"{self.name} assigned task '{task['description']}' to {agent}")
-        self.progress_report.append(f"Assigned task '{task['description']}' to {agent}")
+        self.progress.record(agent, task["id"], "assigned", task["description"])
+        self.report(f"Assigned task '{task['description']}' to {agent}")
+
+    def queue_task(self, task, broker, sources=None, cancel_token=None, run_id=None):
+        """Publish a task to the broker queue for the agent type that handles it.
+
+        Workers publish the result to the run's own result queue (see result_queue).
+        """
+        agent_type = "tester" if task["type"] == "test" else "developer"
+        body = {"task": task, "run_id": run_id}
+        if sources:
+            body["sources"] = sources
+        broker.publish(task_queue(agent_type), body, cancel_token=cancel_token)
+        print(f"{self.name} queued task '{task['description']}' for {agent_type} workers")
+        self.progress.record(f"queue:{task['type']}", task["id"], "queued", task["description"])  # Same key the orchestrator journals under
+        self.report(f"Queued task '{task['description']}' for {agent_type} workers")
+        return agent_type
 
     def perform_task(self, task):
-        """Manager's task is to distribute tasks and generate progress report."""
+        """Manager's task is to distribute tasks; progress is reported as it happens."""
         if task["type"] == "distribute":
-            print(f"{self.name} (Role: {self.role}) executing: {self.description}")
-            for t in self.task_list:
-                if t["type"] == "test":
-                    target = "Tester1"
-                else:
-                    target = "Dev1" if "hello" in t["description"].lower() else "Dev2"
-                self.assign_task(t, target)
-                if "integration_supervision" in self.skills:
-                    self.progress_report.append(f"Ensured no overlap for task '{t['description']}'")
-            self.generate_progress_report()
+            with trace.span("distribute", self.name):
+                print(f"{self.name} (Role: {self.role}) executing: {self.description}")
+                for t in self.task_list:
+                    if t["type"] == "test":
+                        target = "Tester1"
+                    else:
+                        target = "Dev1" if "hello" in t["description"].lower() else "Dev2"
+                    self.assign_task(t, target)
+                    if "integration_supervision" in self.skills:
+                        self.report(f"Ensured no overlap for task '{t['description']}'")
+
+    def report(self, entry):
+        """Append one entry to the progress report, starting a new section for each run."""
+        with open(self.report_file, "a") as f:
+            if self._report_run != self.run_id:
+                f.write(f"Sprint Progress Report by {self.name} (run {self.run_id})\n")
+                f.write(f"Description: {self.description}\n")
+                f.write("Progress:\n")
+                self._report_run = self.run_id
+            f.write(f"- {entry}\n")
 
     def generate_progress_report(self):
-        """Output a sprint-level progress report."""
-        report_file = os.path.join(self.project_dir, "progress_report.txt")
-        with open(report_file, "w") as f:
-            f.write(f"Sprint Progress Report by {self.name}\n")
-            f.write(f"Description: {self.description}\n")
-            f.write("Tasks Assigned:\n")
-            for entry in self.progress_report:
-                f.write(f"- {entry}\n")
-        print(f"{self.name} generated progress report at {report_file}")
+        """Close the report section for this run with the final task counts."""
+        status = self.progress.snapshot()
+        self.report(format_status(status))
+        print(f"{self.name} generated progress report at {self.report_file}")
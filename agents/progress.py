@@ -0,0 +1,131 @@
+import json
+import os
+import threading
+import time
+
+TERMINAL_STATES = ("completed", "failed", "cancelled", "skipped")
+
+
+class ProgressTracker:
+    """Incremental task progress: an append-only event log plus a small status snapshot.
+
+    record() appends one line to progress.jsonl and updates running counts in O(1):
+    tasks per state, tasks per agent and state, and finished tasks for throughput.
+    status.json is rewritten atomically (temp file + rename) at most once every
+    min_interval seconds, and always when a run finishes, so readers such as the GUI
+    and the status command read one small file regardless of how many tasks there are.
+    """
+
+    _shared = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, project_dir, min_interval=0.5):
+        self.events_path = os.path.join(project_dir, "progress.jsonl")
+        self.status_path = os.path.join(project_dir, "status.json")
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._last_write = 0.0
+        self.start_run(None)
+
+    @classmethod
+    def shared(cls, project_dir):
+        """One tracker per project directory, shared by all agents in the process."""
+        with cls._shared_lock:
+            if project_dir not in cls._shared:
+                cls._shared[project_dir] = cls(project_dir)
+            return cls._shared[project_dir]
+
+    def start_run(self, run_id):
+        with self._lock:
+            self.run_id = run_id
+            self.started = time.time()
+            self.states = {}  # (agent, task_id) -> latest state
+            self.counts = {}
+            self.agent_counts = {}
+            self.finished = 0
+            self.first_finish = None
+            self.done = False
+
+    def record(self, agent, task_id, state, description=None):
+        now = time.time()
+        event = {"ts": now, "run_id": self.run_id, "agent": agent, "task_id": task_id, "state": state}
+        if description:
+            event["description"] = description
+        with self._lock:
+            with open(self.events_path, "a") as f:
+                f.write(json.dumps(event) + "\n")
+            key = (agent, task_id)
+            per_agent = self.agent_counts.setdefault(agent, {})
+            previous = self.states.get(key)
+            if previous is not None:
+                self.counts[previous] -= 1
+                per_agent[previous] -= 1
+            self.states[key] = state
+            self.counts[state] = self.counts.get(state, 0) + 1
+            per_agent[state] = per_agent.get(state, 0) + 1
+            if state in TERMINAL_STATES and previous not in TERMINAL_STATES:
+                self.finished += 1
+                if self.first_finish is None:
+                    self.first_finish = now
+            elif previous in TERMINAL_STATES and state not in TERMINAL_STATES:
+                self.finished -= 1  # Re-run of a task that had finished
+            if now - self._last_write >= self.min_interval:
+                self._write_snapshot(now)
+
+    def finish(self):
+        """Mark the run finished and write the snapshot immediately."""
+        with self._lock:
+            self.done = True
+            self._write_snapshot(time.time())
+
+    def snapshot(self, now=None):
+        now = now or time.time()
+        elapsed = now - self.started
+        total = len(self.states)
+        remaining = total - self.finished
+        rate = self.finished / elapsed if self.finished and elapsed > 0 else None
+        return {
+            "run_id": self.run_id,
+            "updated": now,
+            "started": self.started,
+            "finished": self.done,
+            "total": total,
+            "counts": {state: n for state, n in self.counts.items() if n},
+            "agents": {
+                agent: {"queue_depth": counts.get("assigned", 0) + counts.get("queued", 0) + counts.get("started", 0),
+                        "completed": counts.get("completed", 0) + counts.get("skipped", 0),
+                        "failed": counts.get("failed", 0)}
+                for agent, counts in self.agent_counts.items()
+            },
+            "tasks_per_min": rate * 60 if rate else None,
+            "eta_s": remaining / rate if rate and not self.done else (0 if self.done else None)
+        }
+
+    def _write_snapshot(self, now):
+        tmp_path = self.status_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.snapshot(now), f)
+        os.replace(tmp_path, self.status_path)
+        self._last_write = now
+
+
+def read_status(project_dir):
+    """The latest status snapshot for a project, or None if there is none yet."""
+    try:
+        with open(os.path.join(project_dir, "status.json"), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def format_status(status):
+    """One-line summary of a status snapshot."""
+    counts = ", ".join(f"{n} {state}" for state, n in sorted(status["counts"].items())) or "no tasks"
+    queues = " ".join(f"{agent}:{a['queue_depth']}" for agent, a in sorted(status["agents"].items()))
+    if status["finished"]:
+        eta = "finished"
+    elif status["eta_s"] is not None:
+        eta = f"ETA {status['eta_s']:.0f}s"
+    else:
+        eta = "ETA unknown"
+    return f"Run {status['run_id']}: {counts} | queues {queues or '-'} | {eta}"
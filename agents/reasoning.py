@@ -0,0 +1,79 @@
+import re
+
+# Words in a task description that suggest more than a one-line answer
+_COMPLEX_HINTS = re.compile(
+    r"\b(algorithm|parse|parser|optimi[sz]e|recursive|recursion|concurren\w*|thread\w*|async|cache|"
+    r"sort|search|graph|tree|regex|validate|protocol|refactor|class|integrat\w*|edge cases?)\b",
+    re.IGNORECASE
+)
+
+
+class ReasoningPolicy:
+    """Decides per call whether the model should think, and caps generation length.
+
+    mode "on" always appends /think, "off" always appends /no_think, and "auto" thinks
+    only for tasks that look complex or for agents whose recent outputs have been
+    failing validation. A task's own "reasoning" field overrides the mode. Callers
+    escalate to thinking for a retry when a fast answer fails validation.
+    num_predict/num_ctx are sent as Ollama options; thinking calls get the larger
+    think_* budget.
+    """
+
+    def __init__(self, mode="auto", num_predict=512, num_ctx=4096, think_num_predict=4096, think_num_ctx=8192,
+                 complexity_threshold=2, failure_threshold=0.3, min_samples=3):
+        if mode not in ("on", "off", "auto"):
+            raise ValueError(f"Unknown reasoning mode: {mode}")
+        self.mode = mode
+        self.num_predict = num_predict
+        self.num_ctx = num_ctx
+        self.think_num_predict = think_num_predict
+        self.think_num_ctx = think_num_ctx
+        self.complexity_threshold = complexity_threshold
+        self.failure_threshold = failure_threshold
+        self.min_samples = min_samples
+        self.attempts = 0
+        self.failures = 0
+
+    @staticmethod
+    def complexity(task):
+        """Rough score: 0 for a constant-returning stub, higher for longer or algorithmic specs."""
+        description = task.get("description", "")
+        score = len(_COMPLEX_HINTS.findall(description))
+        score += len(description.split()) // 20
+        if task.get("type") == "test" and not task.get("test_spec", {}).get("combination"):
+            score += 1  # The model has to design the test itself
+        if task.get("type") != "test" and "return_value" not in task:
+            score += 1  # Behaviour is not pinned down by the spec
+        return score
+
+    def failure_rate(self):
+        return self.failures / self.attempts if self.attempts else 0.0
+
+    def should_think(self, task):
+        mode = task.get("reasoning", self.mode)
+        if mode != "auto":
+            return mode == "on"
+        if self.complexity(task) >= self.complexity_threshold:
+            return True
+        return self.attempts >= self.min_samples and self.failure_rate() >= self.failure_threshold
+
+    def options(self, think):
+        """Ollama options bounding generation for a thinking or non-thinking call."""
+        options = {}
+        num_predict = self.think_num_predict if think else self.num_predict
+        num_ctx = self.think_num_ctx if think else self.num_ctx
+        if num_predict:
+            options["num_predict"] = num_predict
+        if num_ctx:
+            options["num_ctx"] = num_ctx
+        return options
+
+    @staticmethod
+    def suffix(think):
+        return "/think" if think else "/no_think"
+
+    def record(self, passed):
+        """Record whether a generation passed validation; feeds the auto mode's failure rate."""
+        self.attempts += 1
+        if not passed:
+            self.failures += 1
@@ -0,0 +1,97 @@
+import heapq
+import itertools
+import time
+from datetime import datetime
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+CLASS_RANK = {INTERACTIVE: 0, BATCH: 1}
+
+
+def class_rank(task_class):
+    """Interactive work sorts before batch work; unknown classes count as batch."""
+    return CLASS_RANK.get(task_class, CLASS_RANK[BATCH])
+
+
+def task_deadline(task, start):
+    """Absolute deadline of a task, or None.
+
+    "deadline" in tasks.json is either a number of seconds after the run starts or an
+    ISO 8601 timestamp.
+    """
+    deadline = task.get("deadline")
+    if deadline is None:
+        return None
+    if isinstance(deadline, (int, float)):
+        return start + deadline
+    try:
+        return datetime.fromisoformat(deadline).timestamp()
+    except (TypeError, ValueError):
+        print(f"Ignoring invalid deadline {deadline!r} on task {task.get('id')}")
+        return None
+
+
+def task_order(task, start):
+    """Sort key for an agent's own queue: class, then priority (higher first), then earliest deadline."""
+    deadline = task_deadline(task, start)
+    return (class_rank(task.get("class", BATCH)), -task.get("priority", 0),
+            deadline if deadline is not None else float("inf"))
+
+
+class FairScheduler:
+    """Orders tasks across agents by weighted fair queuing.
+
+    Each agent has its own queue, ordered by task_order, so a newly added urgent task
+    goes ahead of lower-priority work that is still queued. Agents take turns by
+    start-time fair queuing: the next task comes from the agent with the smallest
+    virtual start time, and an agent's virtual time advances by the time its task took
+    divided by its weight. An agent with a long backlog of slow tasks therefore cannot
+    starve the others. Interactive tasks are served before any batch task.
+    """
+
+    def __init__(self, weights=None, start=None):
+        self.weights = weights or {}
+        self.start = start or time.time()
+        self.queues = {}  # agent -> heap of (order, seq, task)
+        self.finish = {}  # agent -> virtual time at which its last task finished
+        self.virtual_time = 0.0
+        self.misses = []  # (agent, task, seconds late)
+        self._started = {}  # (agent, task id) -> (virtual start, wall clock start)
+        self._seq = itertools.count()
+
+    def __len__(self):
+        return sum(len(q) for q in self.queues.values())
+
+    def add(self, agent, task):
+        heapq.heappush(self.queues.setdefault(agent, []), (task_order(task, self.start), next(self._seq), task))
+
+    def peek(self, agent, n):
+        """The next n tasks queued for agent, in the order they will run, without removing them."""
+        return [task for _, _, task in heapq.nsmallest(n, self.queues.get(agent, []))]
+
+    def next(self):
+        """Pop the next (agent, task) to run, or None when every queue is empty."""
+        candidates = [(q[0][0][0], max(self.finish.get(agent, 0.0), self.virtual_time), agent)
+                      for agent, q in self.queues.items() if q]
+        if not candidates:
+            return None
+        _, virtual_start, agent = min(candidates)
+        _, _, task = heapq.heappop(self.queues[agent])
+        self.virtual_time = virtual_start
+        self._started[(agent, task["id"])] = (virtual_start, time.time())
+        return agent, task
+
+    def done(self, agent, task):
+        """Charge the task's run time to its agent; returns how many seconds it missed its deadline by, or None."""
+        virtual_start, started = self._started.pop((agent, task["id"]), (self.virtual_time, time.time()))
+        now = time.time()
+        self.finish[agent] = virtual_start + (now - started) / max(self.weights.get(agent, 1.0), 1e-6)
+        return self.check_deadline(agent, task, now)
+
+    def check_deadline(self, agent, task, now=None):
+        deadline = task_deadline(task, self.start)
+        now = now or time.time()
+        if deadline is None or now <= deadline:
+            return None
+        self.misses.append((agent, task, now - deadline))
+        return now - deadline
@@ -0,0 +1,136 @@
+import json
+import os
+import threading
+import requests
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class SemanticCache:
+    """Finds earlier validated artifacts for tasks that are worded differently but mean the same.
+
+    Each cached task spec is embedded with embed(texts) -> list of vectors (normally
+    LocalModelClient.embed; any callable works). The unit-normalised vectors are rows
+    of one NumPy matrix, so a lookup is a single matrix-vector product followed by a
+    top-k over the cosine scores. Entries are persisted to semantic_cache.jsonl and
+    point at artifacts in the ArtifactStore by sha. Similar wording does not mean the
+    same function, so callers should only reuse an entry whose exact spec (see
+    spec_fields) equals the task's, and must still validate the code.
+    """
+
+    def __init__(self, project_dir, embed, threshold=0.9, top_k=3):
+        if np is None:
+            raise RuntimeError("numpy is required for the semantic cache")
+        self.path = os.path.join(project_dir, "semantic_cache.jsonl")
+        self.embed = embed
+        self.threshold = threshold
+        self.top_k = top_k
+        self.entries = []
+        self._matrix = None  # Rows 0..len(entries)-1 are in use; capacity doubles as it fills
+        self._rows_by_type = {}  # Task type -> matrix rows of its entries
+        self._lock = threading.Lock()  # Guards entries and the matrix; never held while embedding
+        self._load()
+
+    SPEC_FIELDS = ("function_name", "return_value")
+
+    @classmethod
+    def spec_fields(cls, task):
+        """The fields that must match exactly for cached code to be correct for task."""
+        return {field: task.get(field) for field in cls.SPEC_FIELDS}
+
+    @staticmethod
+    def spec_text(task):
+        """The parts of a task that determine the code, as one string to embed."""
+        parts = [task.get("type", ""), task.get("description", "")]
+        for field in ("function_name", "return_value"):
+            if field in task:
+                parts.append(f"{field}: {task[field]}")
+        return "\n".join(parts)
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        entries, vectors = [], []
+        with open(self.path, "r") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Torn write
+                vectors.append(entry.pop("vector"))
+                entries.append(entry)
+        if entries:
+            dims = {len(v) for v in vectors}
+            if len(dims) > 1:
+                print(f"Ignoring {self.path}: it mixes embedding sizes (was the embedding model changed?)")
+                return
+            self.entries = entries
+            self._matrix = self._normalise(np.array(vectors, dtype=np.float32))
+            for row, entry in enumerate(entries):
+                self._rows_by_type.setdefault(entry["type"], []).append(row)
+
+    @staticmethod
+    def _normalise(vectors):
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def _embed_one(self, text):
+        try:
+            return self._normalise(np.array(self.embed([text])[0], dtype=np.float32))
+        except (requests.RequestException, KeyError, IndexError, ValueError) as e:
+            print(f"Semantic cache could not embed task spec: {e}")
+            return None
+
+    def lookup(self, task):
+        """Up to top_k (score, entry) pairs for tasks of the same type scoring at least threshold, best first."""
+        if not self._rows_by_type.get(task.get("type")):
+            return []  # Nothing to compare with, so skip the embedding request
+        vector = self._embed_one(self.spec_text(task))
+        if vector is None:
+            return []
+        with self._lock:
+            rows = np.array(self._rows_by_type.get(task.get("type"), []), dtype=np.intp)
+            if not len(rows) or vector.shape[0] != self._matrix.shape[1]:
+                return []
+            scores = self._matrix[rows] @ vector
+            k = min(self.top_k, len(rows))
+            best = np.argpartition(-scores, k - 1)[:k]
+            best = best[np.argsort(-scores[best])]
+            return [(float(scores[i]), self.entries[rows[i]]) for i in best if scores[i] >= self.threshold]
+
+    def _has(self, spec, sha):
+        return any(entry.get("spec") == spec and entry["sha"] == sha for entry in self.entries)
+
+    def add(self, task, sha, agent=None):
+        """Remember that the artifact sha is a validated solution to task, unless it already is for this spec."""
+        spec = self.spec_fields(task)
+        with self._lock:
+            if self._has(spec, sha):
+                return  # Regenerated identical code; another row would only crowd out other matches
+        vector = self._embed_one(self.spec_text(task))
+        if vector is None:
+            return
+        with self._lock:
+            if self._has(spec, sha):
+                return  # Added by another agent while this one was embedding
+            if self._matrix is not None and vector.shape[0] != self._matrix.shape[1]:
+                return
+            count = len(self.entries)
+            if self._matrix is None:
+                self._matrix = np.empty((8, vector.shape[0]), dtype=np.float32)
+            elif count == self._matrix.shape[0]:
+                grown = np.empty((count * 2, vector.shape[0]), dtype=np.float32)
+                grown[:count] = self._matrix[:count]
+                self._matrix = grown
+            self._matrix[count] = vector
+            entry = {"task_id": task.get("id"), "type": task.get("type"), "description": task.get("description"),
+                     "function_name": task.get("function_name"), "spec": spec,
+                     "sha": sha, "agent": agent}
+            self.entries.append(entry)
+            self._rows_by_type.setdefault(entry["type"], []).append(count)
+            with open(self.path, "a") as f:
+                f.write(json.dumps(dict(entry, vector=[round(float(x), 6) for x in vector])) + "\n")
@@ -0,0 +1,122 @@
+import ast
+import builtins
+import json
+import os
+
+
+def module_symbols(source):
+    """Public top-level names a module defines, i.e. what `from module import *` would bind."""
+    tree = ast.parse(source)
+    names = []
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.append(node.name)
+        elif isinstance(node, (ast.Assign, ast.AnnAssign)):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            names.extend(t.id for t in targets if isinstance(t, ast.Name))
+    return sorted({n for n in names if not n.startswith("_")})
+
+
+def referenced_names(source):
+    """Free names a script reads: loaded but never bound in it and not builtins."""
+    tree = ast.parse(source)
+    loaded, bound = set(), set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name):
+            (loaded if isinstance(node.ctx, ast.Load) else bound).add(node.id)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            bound.add(node.name)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            bound.update((alias.asname or alias.name).split(".")[0] for alias in node.names)
+        elif isinstance(node, ast.arg):
+            bound.add(node.arg)
+    return sorted(loaded - bound - set(dir(builtins)))
+
+
+class SymbolIndex:
+    """Index of which generated module in src/ defines which top-level symbol.
+
+    refresh() stats every file and re-parses only those whose size, mtime or inode
+    changed since the last refresh, so keeping the index current costs one stat per
+    module. The index is saved next to src/ so another process starts warm.
+    """
+
+    def __init__(self, src_dir, cache_path=None, artifacts=None):
+        self.src_dir = src_dir
+        self.artifacts = artifacts  # ArtifactStore whose manifest says when each module was generated
+        self.cache_path = cache_path or os.path.join(os.path.dirname(os.path.abspath(src_dir)), "symbol_index.json")
+        self.modules = {}  # module name -> {"stamp": [size, mtime_ns, inode], "symbols": [...]}
+        self.by_symbol = {}
+        try:
+            with open(self.cache_path, "r") as f:
+                self.modules = json.load(f)
+        except (OSError, ValueError):
+            self.modules = {}
+        self._rebuild_lookup()
+
+    def _rebuild_lookup(self):
+        self.by_symbol = {}
+        for module, info in self.modules.items():
+            for name in info["symbols"]:
+                self.by_symbol.setdefault(name, []).append(module)
+
+    def refresh(self):
+        """Bring the index up to date with src/; returns the number of modules re-parsed."""
+        seen, parsed = set(), 0
+        if os.path.isdir(self.src_dir):
+            for entry in os.scandir(self.src_dir):
+                if not entry.name.endswith(".py"):
+                    continue
+                module = entry.name[:-3]
+                seen.add(module)
+                st = entry.stat()
+                stamp = [st.st_size, st.st_mtime_ns, st.st_ino]
+                cached = self.modules.get(module)
+                if cached and cached["stamp"] == stamp:
+                    continue
+                try:
+                    with open(entry.path, "r") as f:
+                        symbols = module_symbols(f.read())
+                except (OSError, SyntaxError, ValueError):
+                    symbols = []
+                self.modules[module] = {"stamp": stamp, "symbols": symbols}
+                parsed += 1
+        removed = set(self.modules) - seen
+        for module in removed:
+            del self.modules[module]
+        if parsed or removed:
+            self._rebuild_lookup()
+            tmp_path = self.cache_path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.modules, f)
+            os.replace(tmp_path, self.cache_path)
+        return parsed
+
+    def resolve(self, names):
+        """Map the names a test uses to the modules to import them from.
+
+        Returns (imports, ambiguous): imports maps module -> sorted names, and ambiguous
+        maps each name defined by several modules to all of them. An ambiguous name is
+        imported from the most recently generated module that defines it.
+        """
+        imports, ambiguous = {}, {}
+        for name in names:
+            modules = self.by_symbol.get(name)
+            if not modules:
+                continue
+            if len(modules) > 1:
+                ambiguous[name] = sorted(modules)
+                module = max(modules, key=self.generated_at)
+            else:
+                module = modules[0]
+            imports.setdefault(module, []).append(name)
+        return {m: sorted(n) for m, n in imports.items()}, ambiguous
+
+    def generated_at(self, module):
+        """When a module was generated: its artifact record's timestamp, else its mtime.
+
+        A file's mtime is when it was last materialised, e.g. by a rollback, which need
+        not be the order in which the modules were generated.
+        """
+        entry = self.artifacts.latest(f"{module}.py") if self.artifacts else None
+        return entry["ts"] if entry else self.modules[module]["stamp"][1] / 1e9
@@ -1,93 +1,93 @@
 from .base import BaseAgent
 import os
+import signal
 import subprocess
-import re
+from .extract import extract_code, script_source
+from .symbols import SymbolIndex, referenced_names
+from .artifacts import ArtifactStore
+from . import trace
 
 class TestingAgent(BaseAgent):
+    system_prompt = (
+        "You are a QA engineer writing short Python test scripts for generated code. "
+        "Provide only the test code to run the test, no explanations or comments."
+    )
+
     def __init__(self, name, role, skills, description, project_dir, timeout=120):
         super().__init__(name, role, skills, description, project_dir, timeout=timeout)
         self.src_dir = os.path.join(project_dir, "src")
         self.test_dir = os.path.join(project_dir, "tests")
         os.makedirs(self.test_dir, exist_ok=True)
+        self.symbols = SymbolIndex(self.src_dir, artifacts=ArtifactStore(project_dir))
 
     def perform_task(self, task, console_queue=None):
-        """Generate and run a test script using the local AI model. Output to console_queue if provided."""
+        """Generate and run a test script using the local AI model. Output to console_queue if provided.
+
+        Returns the list of files written, or None if no test could be run or it failed.
+        """
         def send_console(msg):
             print(msg)
             if console_queue:
                 console_queue.put(msg + '\n')
         send_console(f"{self.name} (Role: {self.role}) testing task: {task['description']} ({self.description})")
+        for msg in self.receive_topic_messages():
+            send_console(f"{self.name} received {msg['topic']} message from {msg['sender']}: {msg['message']}")
         
-        # Collect developer code file names
-        dev_files = [f for f in os.listdir(self.src_dir) if f.endswith('.py')]
+        # Collect developer code file names, updating the symbol index for any that changed
+        self.symbols.refresh()
+        dev_files = sorted(f"{module}.py" for module in self.symbols.modules)
         if not dev_files:
             send_console(f"{self.name} found no code to test")
-            return
+            return None
 
         prelude = (
            "import sys\n"
            "import os\n"
            "sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))\n"
         )
-        import_lines = [f"from src.{os.path.splitext(f)[0]} import *" for f in dev_files]
         
         # Get test specification
-        test_spec = task.get("test_spec", {})
-        combination = test_spec.get("combination", "")
-        expected_output = test_spec.get("expected_output", "")
+        expected_output = task.get("test_spec", {}).get("expected_output", "")
         
         # Generate test code using the model
-        prompt = (
-            f"You are testing a Python program with the following files: {', '.join(dev_files)}.\n"
-            f"The task is: {task['description']}.\n"
-        )
-        if combination:
-            prompt += f"Use this test code: {combination}\n"
-        else:
-            prompt += "Generate a test script that imports the developer files and calls their functions to produce the expected output.\n"
-        if expected_output:
-            prompt += f"The expected output is: '{expected_output}'.\n"
-        prompt += (
-            "Provide only the test code to run the test, no explanations or comments."
-        )
+        with trace.span("prompt_build", self.name):
+            prompt = self.build_prompt(task, dev_files)
         
-        test_code = self.call_local_model(prompt)
-        if not test_code:
+        think = self.reasoning.should_think(task)
+        filtered_code = self.generate(prompt, think)
+        self.reasoning.record(bool(filtered_code))
+        if not filtered_code and not think:
+            send_console(f"{self.name} escalating to thinking mode for task {task['description']}")
+            filtered_code = self.generate(prompt, True)
+        if filtered_code is None:
             send_console(f"{self.name} failed to generate test script")
-            return
-        
-        # Filter out non-Python lines (keep only import statements, function calls, assignments, print statements)
-        code_lines = []
-        for line in test_code.splitlines():
-            l = line.strip()
-            if not l or l.startswith('#'):
-                continue
-            if re.match(r'^(import |from |print\(|[\w_]+ ?=|[\w_]+\()', l):
-                code_lines.append(l)
-        filtered_code = '\n'.join(code_lines)
+            return None
         if not filtered_code:
             send_console(f"{self.name} test script did not contain valid Python code.")
-            return
-
-        combined_script = prelude + '\n'.join(import_lines) + '\n\n' + filtered_code
+            return None
 
-        # Compose the test script: import developer files, then run the test code
-        import_lines = [f"from src.{os.path.splitext(f)[0]} import *" for f in dev_files]
+        # Compose the test script: import only what the test code uses from the modules that define it
+        imports, ambiguous = self.symbols.resolve(referenced_names(filtered_code))
+        for name, modules in sorted(ambiguous.items()):
+            chosen = next(m for m, names in imports.items() if name in names)
+            send_console(f"{self.name} warning: '{name}' is defined in {', '.join(modules)}; importing it from {chosen}")
+        import_lines = [f"from src.{module} import {', '.join(names)}" for module, names in sorted(imports.items())]
 
         combined_script = prelude + '\n'.join(import_lines) + '\n\n' + filtered_code
 
         test_script_path = os.path.join(self.test_dir, "test_hello_world.py")
-        with open(test_script_path, "w") as f:
+        result_path = os.path.join(self.test_dir, "test_result.txt")
+        with trace.span("file_write", self.name), open(test_script_path, "w") as f:
             f.write(combined_script)
         
         # Run the test script
+        passed = False
         try:
-            result = subprocess.run(
-                ["python", test_script_path],
-                capture_output=True,
-                text=True,
-                check=True
-            )
+            with trace.span("test_exec", self.name):
+                result = self.run_script(test_script_path)
+            if result is None:
+                send_console(f"{self.name} test cancelled")
+                return None
             output = result.stdout.strip()
             send_console(f"{self.name} test output: {output}")
             
@@ -101,7 +101,8 @@ class TestingAgent(BaseAgent):
                 send_console(f"{self.name} test completed with output: {output}")
             
             # Save test result
-            with open(os.path.join(self.test_dir, "test_result.txt"), "w") as f:
+            passed = not expected_output or output == expected_output
+            with open(result_path, "w") as f:
                 f.write(f"Test Result by {self.name}\n")
                 f.write(f"Output: {output}\n")
                 f.write(f"Status: {'Passed' if output == expected_output else 'Failed' if expected_output else 'Completed'}\n")
@@ -112,7 +113,62 @@ class TestingAgent(BaseAgent):
                 send_console(f"Stdout:\n{e.stdout}")
             if e.stderr:
                 send_console(f"Stderr:\n{e.stderr}")
-            with open(os.path.join(self.test_dir, "test_result.txt"), "w") as f:
+            with open(result_path, "w") as f:
                 f.write(f"Test Result by {self.name}\n")
                 f.write(f"Error: {e}\n")
                 f.write("Status: Failed\n")
+
+        # A failed test is journaled as failed rather than completed, so resuming the run tests again
+        return [test_script_path, result_path] if passed else None
+
+    def generate(self, prompt, think):
+        """Test code recovered from one model reply; "" if the reply had no Python, None if the call failed."""
+        test_code = self.call_local_model(prompt, think=think)
+        if not test_code:
+            return None
+        # Keep only the Python recovered from the reply (fenced blocks, or statements in the prose)
+        with trace.span("extract", self.name):
+            return script_source(extract_code(test_code))
+
+    @staticmethod
+    def build_prompt(task, dev_files):
+        """The per-task part of the prompt; role instructions live in system_prompt."""
+        test_spec = task.get("test_spec", {})
+        combination = test_spec.get("combination", "")
+        expected_output = test_spec.get("expected_output", "")
+        prompt = (
+            f"You are testing a Python program with the following files: {', '.join(dev_files)}.\n"
+            f"The task is: {task['description']}.\n"
+        )
+        if combination:
+            prompt += f"Use this test code: {combination}\n"
+        else:
+            prompt += "Generate a test script that imports the developer files and calls their functions to produce the expected output.\n"
+        if expected_output:
+            prompt += f"The expected output is: '{expected_output}'.\n"
+        return prompt
+
+    def run_script(self, script_path):
+        """Run a script like subprocess.run(check=True), killing its process group if cancelled.
+
+        Returns None when the run was cancelled.
+        """
+        proc = subprocess.Popen(
+            ["python", script_path],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            start_new_session=True  # Own process group, so children die with it
+        )
+        while True:
+            try:
+                stdout, stderr = proc.communicate(timeout=0.1)
+                break
+            except subprocess.TimeoutExpired:
+                if self.cancel_token and self.cancel_token.is_set():
+                    os.killpg(proc.pid, signal.SIGKILL)
+                    proc.communicate()
+                    return None
+        if proc.returncode:
+            raise subprocess.CalledProcessError(proc.returncode, proc.args, stdout, stderr)
+        return subprocess.CompletedProcess(proc.args, proc.returncode, stdout, stderr)
@@ -0,0 +1,137 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Not on Windows; compaction is then only safe within one process
+
+
+class TopicBus:
+    """Topic-based fan-out over append-only files in the comms directory.
+
+    publish() appends one line to topic_<topic>.jsonl however many agents subscribe.
+    Each subscriber keeps its own offset per topic in topic_<topic>.<subscriber>.cursor,
+    and read() returns only what was published since, so a broadcast costs one write
+    and each subscriber reads it once.
+
+    The log is a bounded window, not the history (every published message is also in
+    the MessageArchive). Once it exceeds compact_bytes, publish() drops what every
+    subscriber has read, and beyond max_bytes it drops the oldest messages anyway, so
+    a subscriber that stopped reading cannot make it grow without limit. Offsets count
+    from the first message ever published; a compacted log starts with a
+    {"base": offset} line giving the offset of the line after it.
+    """
+
+    _thread_lock = threading.Lock()
+
+    def __init__(self, comms_dir, compact_bytes=64 * 1024, max_bytes=1024 * 1024):
+        self.comms_dir = comms_dir
+        self.compact_bytes = compact_bytes
+        self.max_bytes = max_bytes
+
+    def _log_path(self, topic):
+        return os.path.join(self.comms_dir, f"topic_{topic}.jsonl")
+
+    def _cursor_path(self, topic, subscriber):
+        return os.path.join(self.comms_dir, f"topic_{topic}.{subscriber}.cursor")
+
+    @contextmanager
+    def _exclusive(self, topic):
+        """Serialise publishers and compaction of a topic, across processes where supported."""
+        with self._thread_lock:
+            if fcntl is None:
+                yield
+                return
+            with open(os.path.join(self.comms_dir, f"topic_{topic}.lock"), "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def publish(self, topic, sender, message):
+        record = {"sender": sender, "topic": topic, "message": message}
+        path = self._log_path(topic)
+        with self._exclusive(topic):
+            with open(path, "a") as f:
+                f.write(json.dumps(record) + "\n")  # One write, so concurrent publishers don't interleave lines
+            if os.path.getsize(path) > self.compact_bytes:
+                self._compact(topic)
+        return record
+
+    @staticmethod
+    def _header(f):
+        """(base offset, header length) of an open log; (0, 0) for a log never compacted."""
+        line = f.readline()
+        f.seek(0)
+        if line.startswith(b'{"base"'):
+            try:
+                return json.loads(line)["base"], len(line)
+            except (ValueError, KeyError):
+                pass
+        return 0, 0
+
+    def _cursor(self, topic, subscriber):
+        try:
+            with open(self._cursor_path(topic, subscriber), "r") as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _cursors(self, topic):
+        prefix = f"topic_{topic}."
+        return [self._cursor(topic, name[len(prefix):-len(".cursor")]) for name in os.listdir(self.comms_dir)
+                if name.startswith(prefix) and name.endswith(".cursor")]
+
+    def _compact(self, topic):
+        # Called with the topic lock held, so no publish can land in the file being replaced
+        path = self._log_path(topic)
+        with open(path, "rb") as f:
+            base, header = self._header(f)
+            f.seek(header)
+            data = f.read()
+        # Drop what every subscriber has read, then the oldest lines beyond max_bytes
+        drop = max(0, min(self._cursors(topic), default=base) - base)
+        if len(data) - drop > self.max_bytes:
+            drop = max(drop, data.find(b"\n", len(data) - self.max_bytes - 1) + 1)
+        if drop <= 0:
+            return
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(json.dumps({"base": base + drop}).encode("utf-8") + b"\n" + data[drop:])
+        os.replace(tmp_path, path)
+
+    def read(self, topic, subscriber):
+        """Messages published on topic since subscriber last read it, oldest first.
+
+        A subscriber that fell behind the retained window resumes at its oldest message.
+        """
+        path = self._log_path(topic)
+        if not os.path.exists(path):
+            return []
+        offset = self._cursor(topic, subscriber)
+        with open(path, "rb") as f:
+            base, header = self._header(f)
+            size = os.fstat(f.fileno()).st_size
+            if offset > base + size - header:
+                offset = base  # The log was cleared and started again
+            offset = max(offset, base)
+            f.seek(header + offset - base)
+            data = f.read()
+        end = data.rfind(b"\n") + 1  # Leave a line that is still being written for the next read
+        if not end:
+            return []
+        records = []
+        for line in data[:end].splitlines():
+            if line.strip():
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue  # Torn write
+        cursor_path = self._cursor_path(topic, subscriber)
+        with open(cursor_path + ".tmp", "w") as f:
+            f.write(str(offset + end))
+        os.replace(cursor_path + ".tmp", cursor_path)
+        return records
@@ -0,0 +1,135 @@
+"""Lightweight stage-level tracing.
+
+Wrap a stage in `with trace.span("llm_wait", agent.name):`. While tracing is disabled
+span() returns a shared no-op context manager, so instrumented code pays one global
+lookup and a call. When enabled, each span records its wall-clock interval and
+thread; export_chrome() writes the spans as Chrome trace JSON (chrome://tracing or
+Perfetto) and format_summary() tabulates total and self time per agent and stage.
+"""
+import json
+import os
+import threading
+import time
+
+_enabled = False
+_events = []
+_lock = threading.Lock()
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ("name", "agent", "start")
+
+    def __init__(self, name, agent):
+        self.name = name
+        self.agent = agent
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter_ns()
+        with _lock:
+            _events.append((self.name, self.agent, threading.get_ident(), self.start, end))
+        return False
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def reset():
+    with _lock:
+        del _events[:]
+
+
+def span(name, agent=None):
+    """Context manager timing one stage; a no-op unless tracing is enabled."""
+    if not _enabled:
+        return _NOOP
+    return _Span(name, agent)
+
+
+def export_chrome(path):
+    """Write recorded spans as Chrome trace-event JSON."""
+    with _lock:
+        events = list(_events)
+    origin = min((e[3] for e in events), default=0)
+    pid = os.getpid()
+    trace_events = [
+        {
+            "name": name,
+            "cat": agent or "main",
+            "ph": "X",
+            "ts": (start - origin) / 1000.0,
+            "dur": (end - start) / 1000.0,
+            "pid": pid,
+            "tid": tid,
+            "args": {"agent": agent}
+        }
+        for name, agent, tid, start, end in events
+    ]
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, f)
+    return path
+
+
+def summary():
+    """Rows of (agent, stage, count, total_ms, self_ms), sorted by self time.
+
+    Self time is a span's duration minus the time of spans nested inside it on the
+    same thread.
+    """
+    with _lock:
+        events = sorted(_events, key=lambda e: (e[2], e[3], -e[4]))
+    totals = {}
+    stack = []  # [end, key, child_ns] for the open spans of the current thread
+    current_tid = None
+
+    def close(item):
+        end, key, child_ns, duration = item
+        row = totals.setdefault(key, [0, 0, 0])
+        row[0] += 1
+        row[1] += duration
+        row[2] += duration - child_ns
+
+    for name, agent, tid, start, end in events:
+        if tid != current_tid:
+            while stack:
+                close(stack.pop())
+            current_tid = tid
+        while stack and stack[-1][0] <= start:
+            close(stack.pop())
+        if stack:
+            stack[-1][2] += end - start
+        stack.append([end, (agent or "main", name), 0, end - start])
+    while stack:
+        close(stack.pop())
+    rows = [(agent, stage, count, total / 1e6, self_ns / 1e6)
+            for (agent, stage), (count, total, self_ns) in totals.items()]
+    return sorted(rows, key=lambda r: r[4], reverse=True)
+
+
+def format_summary():
+    lines = [f"{'agent':<20} {'stage':<16} {'count':>6} {'total ms':>10} {'self ms':>10}"]
+    for agent, stage, count, total_ms, self_ms in summary():
+        lines.append(f"{agent:<20} {stage:<16} {count:>6} {total_ms:>10.1f} {self_ms:>10.1f}")
+    return "\n".join(lines)
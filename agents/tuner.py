@@ -0,0 +1,175 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from . import configedit
+from .base import merge_options
+from .developer import DeveloperAgent
+from .tester import TestingAgent
+from .extract import extract_code, definitions_source, script_source
+from .hardware import detect_hardware, inference_profile
+from .llm import LocalModelClient
+from .reasoning import ReasoningPolicy
+
+# Small tasks shaped like the ones in config/tasks.json. Developer tasks pass if the
+# extracted function returns return_value; tester tasks pass if the extracted script
+# prints expected_output when run after the given definitions.
+CALIBRATION_TASKS = {
+    "developer": [
+        {"id": 1, "description": "Implement Hello function", "type": "code", "function_name": "hello", "return_value": "Hello"},
+        {"id": 2, "description": "Create a greeting function", "type": "code", "function_name": "greet", "return_value": "Good morning"},
+        {"id": 3, "description": "Implement a status function", "type": "code", "function_name": "status", "return_value": "OK"},
+    ],
+    "tester": [
+        {"id": 1, "description": "Test Hello World output", "type": "test",
+         "test_spec": {"combination": "print(hello() + ' ' + world())", "expected_output": "Hello World"},
+         "definitions": "def hello():\n    return 'Hello'\n\ndef world():\n    return 'World'\n"},
+        {"id": 2, "description": "Test the greeting output", "type": "test",
+         "test_spec": {"combination": "print(greet())", "expected_output": "Good morning"},
+         "definitions": "def greet():\n    return 'Good morning'\n"},
+    ],
+}
+ROLE_CLASSES = {"developer": DeveloperAgent, "tester": TestingAgent}
+
+
+def _run_python(source, timeout=10):
+    try:
+        result = subprocess.run([sys.executable, "-c", source], capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return None
+    return result.stdout.strip() if result.returncode == 0 else None
+
+
+def _passes(role, task, reply):
+    blocks = extract_code(reply)
+    if role == "developer":
+        code = definitions_source(blocks)
+        if not code:
+            return False
+        return _run_python(f"{code}\nprint({task['function_name']}())") == task["return_value"]
+    script = script_source(blocks)
+    if not script:
+        return False
+    return _run_python(f"{task['definitions']}\n{script}") == task["test_spec"]["expected_output"]
+
+
+def role_settings(config, role):
+    """(reasoning policy, inference profile, model options) that agents of a role run with under config.
+
+    Built the way load_agents in main.py builds them, from the first agent of the role.
+    """
+    agent_config = next((a for a in config.get("agents", []) if a.get("type") == role), {})
+    policy = ReasoningPolicy(**dict(config.get("reasoning", {}), **agent_config.get("reasoning", {})))
+    profile = dict(inference_profile(detect_hardware()), **config.get("profile", {}))
+    profile.update(agent_config.get("profile", {}))
+    return policy, profile, agent_config.get("options", {})
+
+
+def benchmark_model(client, model, role, repeat=1, settings=None):
+    """Run the calibration tasks for a role on one model; returns latency, tokens/sec and pass rate.
+
+    Each task is sent with the reasoning mode and options the role's agents would use
+    for it, given settings from role_settings (default: a stock ReasoningPolicy).
+    """
+    role_class = ROLE_CLASSES[role]
+    policy, profile, model_options = settings or (ReasoningPolicy(), {}, {})
+    latencies, rates, passed, total = [], [], 0, 0
+    for _ in range(repeat):
+        for task in CALIBRATION_TASKS[role]:
+            if role == "developer":
+                prompt = role_class.build_prompt(task)
+            else:
+                prompt = role_class.build_prompt(task, ["generated.py"])
+            think = policy.should_think(task)
+            options = merge_options(profile, policy.options(think), model_options)
+            messages = [{"role": "system", "content": role_class.system_prompt},
+                        {"role": "user", "content": f"{prompt} {policy.suffix(think)}"}]
+            start = time.time()
+            stats = {}
+            reply = client.chat(messages, options=options, model=model, on_stats=stats.update)
+            latencies.append(time.time() - start)
+            if reply is not None and stats.get("eval_duration"):
+                rates.append(stats["eval_count"] / (stats["eval_duration"] / 1e9))
+            total += 1
+            if reply is not None and _passes(role, task, reply):
+                passed += 1
+    return {
+        "model": model,
+        "role": role,
+        "avg_latency_s": sum(latencies) / len(latencies) if latencies else None,
+        "tokens_per_s": sum(rates) / len(rates) if rates else None,
+        "pass_rate": passed / total if total else 0.0,
+    }
+
+
+def suggest(results, sizes, threshold):
+    """Per role, the smallest model whose pass rate meets threshold (ties go to the faster one)."""
+    suggestions = {}
+    for role in ROLE_CLASSES:
+        qualifying = [r for r in results if r["role"] == role and r["pass_rate"] >= threshold]
+        if qualifying:
+            best = min(qualifying, key=lambda r: (sizes.get(r["model"], float("inf")), r["avg_latency_s"] or 0))
+            suggestions[role] = best["model"]
+    return suggestions
+
+
+def set_agent_models(text, models):
+    """Set "model" on every agent in a config file's text whose type is in models.
+
+    Only the changed values are rewritten (a "model" key is added to agents without
+    one), so the rest of the file keeps its formatting. Returns (text, names of the
+    agents changed).
+    """
+    agents = configedit.value_start(text, configedit.root(text), "agents")
+    changed = []
+    for start, end in reversed(configedit.elements(text, agents)):  # Later edits don't move earlier agents
+        agent = json.loads(text[start:end])
+        model = models.get(agent.get("type"))
+        if model is not None and agent.get("model") != model:
+            text = configedit.set_member(text, start, "model", model)
+            changed.append(agent.get("name", agent.get("type")))
+    return text, changed[::-1]
+
+
+def tune(project_dir, config_file, models=None, threshold=0.8, repeat=1, apply=False):
+    """Benchmark installed models per role, save the results, and optionally update the agent config."""
+    client = LocalModelClient("Tuner", max_retries=1)
+    installed = client.list_models()
+    sizes = {m["name"]: m.get("size", 0) for m in installed}
+    models = models or sorted(sizes, key=lambda name: sizes[name])
+    print(f"Tuning {len(models)} model(s): {', '.join(models)}")
+    with open(config_file, "r") as f:
+        config = json.load(f)
+    settings = {role: role_settings(config, role) for role in ROLE_CLASSES}
+
+    results = []
+    for model in models:
+        for role in ROLE_CLASSES:
+            result = benchmark_model(client, model, role, repeat=repeat, settings=settings[role])
+            results.append(result)
+            latency = f"{result['avg_latency_s']:.2f}s" if result["avg_latency_s"] is not None else "n/a"
+            rate = f"{result['tokens_per_s']:.1f}" if result["tokens_per_s"] is not None else "n/a"
+            print(f"  {model:<24} {role:<10} latency {latency:>8}  tok/s {rate:>7}  pass {result['pass_rate']:.0%}")
+
+    suggestions = suggest(results, sizes, threshold)
+    report_path = os.path.join(project_dir, "tuning.json")
+    with open(report_path, "w") as f:
+        json.dump({"ts": time.time(), "threshold": threshold, "results": results, "suggestions": suggestions}, f, indent=2)
+    print(f"Tuning results written to {report_path}")
+    for role in ROLE_CLASSES:
+        if role in suggestions:
+            print(f"Suggested model for {role} agents: {suggestions[role]}")
+        else:
+            print(f"No model met the {threshold:.0%} pass threshold for {role} agents")
+
+    if apply and suggestions:
+        with open(config_file, "r") as f:
+            text, changed = set_agent_models(f.read(), suggestions)
+        if changed:
+            with open(config_file, "w") as f:
+                f.write(text)
+            print(f"Updated the model of {', '.join(changed)} in {config_file}")
+        else:
+            print(f"Models in {config_file} already match the suggestions")
+    return suggestions
@@ -0,0 +1,78 @@
+import os
+import requests
+
+def task_queue(agent_type):
+    """Queue that workers of an agent type (as named in config/agents.json) consume from."""
+    return f"tasks.{agent_type}"
+
+
+def result_queue(run_id):
+    """Queue that results of a run's tasks are published to, so orchestrators sharing a broker never see each other's."""
+    return f"results.{run_id}"
+
+
+def collect_artifacts(project_dir, paths):
+    """Read produced files so they can travel with the result to another host."""
+    artifacts = {}
+    for path in paths or []:
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                artifacts[os.path.relpath(path, project_dir)] = f.read()
+    return artifacts
+
+
+def write_sources(agent, sources):
+    """Materialise sources sent with a task (e.g. developer output a tester must import)."""
+    src_dir = os.path.join(agent.project_dir, "src")
+    os.makedirs(src_dir, exist_ok=True)
+    for name, content in sources.items():
+        path = os.path.join(src_dir, os.path.basename(name))
+        if os.path.lexists(path):
+            os.remove(path)
+        with open(path, "w") as f:
+            f.write(content)
+
+
+def run_worker(agent, client, cancel_token, poll_wait=2):
+    """Consume tasks for agent's type from the broker until cancelled.
+
+    Each task is acked only after its result has been published, so a worker that dies
+    mid-task has the task redelivered to another worker when its lease expires.
+    """
+    queue_name = task_queue(agent.agent_type)
+    print(f"{agent.name} worker consuming from '{queue_name}' at {client.url}")
+    while not cancel_token.is_set():
+        try:
+            leased = client.consume(queue_name, wait=poll_wait)
+        except requests.RequestException as e:
+            print(f"{agent.name} worker cannot reach broker: {e}")
+            cancel_token.wait(poll_wait)
+            continue
+        if leased is None:
+            continue
+
+        task = leased["body"]["task"]
+        if leased["attempts"] > 1:
+            print(f"{agent.name} worker received redelivered task {task['id']} (attempt {leased['attempts']})")
+        write_sources(agent, leased["body"].get("sources", {}))
+        try:
+            produced = agent.perform_task(task)
+        except Exception as e:
+            print(f"{agent.name} worker failed task {task['id']}: {e}")
+            client.nack(leased["id"])
+            continue
+        if cancel_token.is_set():
+            client.nack(leased["id"])  # Hand the task back to another worker
+            break
+
+        client.publish(result_queue(leased["body"].get("run_id")), {
+            "task_id": task["id"],
+            "agent": agent.name,
+            "ok": bool(produced),
+            "artifacts": collect_artifacts(agent.project_dir, produced)
+        })
+        try:
+            client.ack(leased["id"])
+        except requests.HTTPError:
+            print(f"{agent.name} worker lease on task {task['id']} expired before ack; it may be redelivered")
+    print(f"{agent.name} worker stopped")
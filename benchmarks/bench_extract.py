@@ -0,0 +1,90 @@
+"""Benchmark code extraction on large model outputs.
+
+Compares agents.extract with the regex-based filtering the agents used before, on
+synthetic replies with long <think> traces, prose and fenced code. The "truncated"
+scenario is a reasoning trace that restarts <think> repeatedly and is cut off before
+the closing tag (as happens when num_predict runs out): nothing in it is an answer,
+and the legacy regex is quadratic on it, so it is only run on the smaller sizes.
+
+Usage: python benchmarks/bench_extract.py [size_kb ...]
+"""
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from agents.extract import extract_code, definitions_source, script_source
+
+
+def legacy_developer_extract(code):
+    code = re.sub(r'<think>[\s\S]*?</think>', '', code, flags=re.IGNORECASE)
+    code_blocks = re.findall(r'((?:def |class )[\s\S]+?)(?=^def |^class |\Z)', code, flags=re.MULTILINE)
+    filtered_code = '\n\n'.join(block.strip() for block in code_blocks if block.strip())
+    if not filtered_code:
+        filtered_code = '\n'.join(line for line in code.splitlines() if line.strip() and not line.strip().startswith('#'))
+    return filtered_code
+
+
+def legacy_tester_extract(test_code):
+    code_lines = []
+    for line in test_code.splitlines():
+        l = line.strip()
+        if not l or l.startswith('#'):
+            continue
+        if re.match(r'^(import |from |print\(|[\w_]+ ?=|[\w_]+\()', l):
+            code_lines.append(l)
+    return '\n'.join(code_lines)
+
+
+LEGACY_TRUNCATED_MAX_KB = 50
+
+
+def make_output(size_kb, scenario="closed", functions=20):
+    """Build a reply with a reasoning trace of roughly size_kb followed by fenced code."""
+    thought = (
+        "Okay, the user wants a function. Let me consider def draft(x): return x, but maybe\n"
+        "a class would be better. ```python\nclass Draft: pass\n``` No, keep it simple.\n"
+    )
+    if scenario == "truncated":
+        thought = "<think>" + thought
+    trace = thought * max(1, (size_kb * 1024) // len(thought))
+    if scenario == "truncated":
+        return f"<think>\n{trace}"
+    code = "\n\n".join(
+        f"def func_{i}(value):\n    if value:\n        return 'result {i}'\n    return None" for i in range(functions)
+    )
+    return f"<think>\n{trace}</think>\nHere is the implementation:\n```python\n{code}\n```\nThis returns the results."
+
+
+def bench(name, fn, text, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return name, best, result
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [100, 400, 800]
+    print(f"{'scenario':<9} {'size':>8} {'extractor':<24} {'time (ms)':>10} {'MB/s':>8} {'defs found':>10}")
+    for scenario in ("closed", "truncated"):
+        for size_kb in sizes:
+            text = make_output(size_kb, scenario)
+            runs = [
+                bench("agents.extract defs", lambda t: definitions_source(extract_code(t)), text),
+                bench("agents.extract script", lambda t: script_source(extract_code(t)), text),
+            ]
+            if scenario == "closed" or size_kb <= LEGACY_TRUNCATED_MAX_KB:
+                runs.append(bench("legacy developer regex", legacy_developer_extract, text, repeat=1))
+                runs.append(bench("legacy tester filter", legacy_tester_extract, text, repeat=1))
+            for name, elapsed, result in runs:
+                found = len(re.findall(r'^def \w+', result, flags=re.MULTILINE))
+                mb_per_s = len(text) / elapsed / 1e6
+                print(f"{scenario:<9} {size_kb:>6}KB {name:<24} {elapsed * 1000:>10.1f} {mb_per_s:>8.1f} {found:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,23 @@ from tkinter import ttk, scrolledtext, messagebox
 import threading
 import queue
 import os
+import time
 import main
+from agents.artifacts import ArtifactStore
+from agents.llm import LocalModelClient, ChatSession
+from agents.cancel import CancelToken
+from agents.broker import serve_broker, BrokerClient
+from agents.worker import run_worker
+from agents.daemon import AgentDaemon, DaemonClient, DaemonError, serve_daemon, DEFAULT_DAEMON_URL
+from agents.archive import MessageArchive
+from agents.topics import TopicBus
+from agents import trace
+from agents.tuner import tune
+from agents.hardware import calibrate
+from agents.progress import read_status, format_status
+from agents.cassette import Cassette
+import signal
+import socket
 import glob2 as glob
 import argparse
 import sys
@@ -15,6 +31,106 @@ try:
 except ImportError:
     TORCH_AVAILABLE = False
 
+def clear_project_outputs(folders=("comms", "src", "tests")):
+    """Remove generated files from the given project folders."""
+    project_dir = os.path.join(os.getcwd(), "project")
+    for folder in folders:
+        folder_path = os.path.join(project_dir, folder)
+        if os.path.exists(folder_path):
+            for file in glob.glob(os.path.join(folder_path, "*")):
+                try:
+                    os.remove(file)
+                except OSError as e:
+                    print(f"Error clearing file {file}: {e}")
+
+class ChatStream:
+    """Streams model replies into a text widget without blocking the Tk thread.
+
+    The request runs on a background thread; tokens are queued and drained by a Tk
+    timer that inserts everything received since the last tick in one batch. Each
+    ChatStream keeps its own conversation history.
+    """
+
+    POLL_MS = 50
+
+    def __init__(self, root, client, text_widget, rate_var, speaker, on_done=None):
+        self.root = root
+        self.client = client
+        self.text = text_widget
+        self.rate_var = rate_var
+        self.speaker = speaker
+        self.on_done = on_done
+        self.session = ChatSession(None, max_turns=10, max_chars=16000)
+        self.tokens = queue.Queue()
+        self.cancel_event = None
+        self.worker = None
+
+    def busy(self):
+        return self.worker is not None and self.worker.is_alive()
+
+    def send(self, prompt, model=None):
+        if self.busy():
+            return False
+        self._insert(f"You: {prompt}\n{self.speaker}: ")
+        self.cancel_event = threading.Event()
+        self.worker = threading.Thread(target=self._run, args=(prompt, model, self.cancel_event), daemon=True)
+        self.worker.start()
+        self.root.after(self.POLL_MS, self._drain)
+        return True
+
+    def cancel(self):
+        if self.cancel_event:
+            self.cancel_event.set()
+
+    def _run(self, prompt, model, cancel_event):
+        start = time.time()
+        count = [0]
+        stats = {}
+
+        def on_token(text):
+            count[0] += 1
+            self.tokens.put(("token", text, count[0] / max(time.time() - start, 1e-6)))
+
+        reply = self.client.chat(self.session.build_messages(prompt), cancel_event=cancel_event,
+                                 on_token=on_token, model=model, on_stats=stats.update)
+        if reply is not None:
+            self.session.add_turn(prompt, reply)
+            rate = stats["eval_count"] / (stats["eval_duration"] / 1e9) if stats.get("eval_duration") else None
+            self.tokens.put(("done", "", rate))
+        elif cancel_event.is_set():
+            self.tokens.put(("done", " [cancelled]", None))
+        else:
+            self.tokens.put(("done", "[no response from the local model]", None))
+
+    def _drain(self):
+        batch = []
+        finished = False
+        rate = None
+        try:
+            while True:
+                kind, text, value = self.tokens.get_nowait()
+                batch.append(text)
+                rate = value if value is not None else rate
+                finished = finished or kind == "done"
+        except queue.Empty:
+            pass
+        if batch:
+            self._insert("".join(batch) + ("\n" if finished else ""))
+        if rate is not None:
+            self.rate_var.set(f"{rate:.1f} tok/s")
+        if finished:
+            if self.on_done:
+                self.on_done()
+        else:
+            self.root.after(self.POLL_MS, self._drain)
+
+    def _insert(self, text):
+        state = self.text.cget("state")
+        self.text.config(state='normal')
+        self.text.insert(tk.END, text)
+        self.text.see(tk.END)
+        self.text.config(state=state)
+
 class AgentSystemGUI:
     def __init__(self, root):
         self.root = root
@@ -28,6 +144,10 @@ class AgentSystemGUI:
         # Flag to control output processing
         self.running = True
         self.execution_thread = None
+        self.cancel_token = None
+
+        # Model client shared by the LLM and Chat tabs
+        self.llm_client = LocalModelClient("GUI")
         
         # Load tasks from tasks.json if it exists
         self.tasks = []
@@ -59,6 +179,14 @@ class AgentSystemGUI:
         # Run button
         self.run_button = ttk.Button(button_frame, text="Run Agent System", command=self.run_system)
         self.run_button.pack(side=tk.LEFT, padx=5)
+
+        # Resume button
+        self.resume_button = ttk.Button(button_frame, text="Resume", command=lambda: self.run_system(resume=True))
+        self.resume_button.pack(side=tk.LEFT, padx=5)
+
+        # Stop button
+        self.stop_button = ttk.Button(button_frame, text="Stop", command=self.stop_system, state='disabled')
+        self.stop_button.pack(side=tk.LEFT, padx=5)
         
         # View code button
         self.code_button = ttk.Button(button_frame, text="View Source Code", command=self.view_source_code)
@@ -106,6 +234,13 @@ class AgentSystemGUI:
         self.test_button.bind("<Button-1>", lambda e: print("View Test Results button clicked"))
 
     def create_tasks_tab(self):
+        # Live run status from project/status.json
+        self.task_status_var = tk.StringVar(value="No run status yet")
+        status_label = ttk.Label(self.tasks_frame, textvariable=self.task_status_var, anchor="w", wraplength=560)
+        status_label.pack(side=tk.BOTTOM, fill=tk.X, padx=5, pady=(0, 5))
+        self.task_status_mtime = None
+        self.refresh_task_status()
+
         # Listbox for tasks
         self.tasks_listbox = tk.Listbox(self.tasks_frame, height=12)
         self.tasks_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=5, pady=5)
@@ -128,6 +263,21 @@ class AgentSystemGUI:
 
         self.refresh_tasks_listbox()
 
+    def refresh_task_status(self):
+        """Show the latest status snapshot; only re-read when the file has been replaced."""
+        status_path = os.path.join(os.getcwd(), "project", "status.json")
+        try:
+            mtime = os.stat(status_path).st_mtime
+        except OSError:
+            mtime = None
+        if mtime is not None and mtime != self.task_status_mtime:
+            status = read_status(os.path.join(os.getcwd(), "project"))
+            if status:
+                self.task_status_var.set(format_status(status))
+                self.task_status_mtime = mtime
+        if self.running:
+            self.root.after(1000, self.refresh_task_status)
+
     def refresh_tasks_listbox(self):
         self.tasks_listbox.delete(0, tk.END)
         for idx, task in enumerate(self.tasks):
@@ -260,14 +410,16 @@ class AgentSystemGUI:
         except tk.TclError:
             pass
 
-    def run_system(self):
-        """Run main.py in a separate thread."""
+    def run_system(self, resume=False):
+        """Run main.py in a separate thread. When resuming, generated sources and tests are kept."""
         print("Attempting to run system")
         if self.execution_thread and self.execution_thread.is_alive():
             messagebox.showinfo("Info", "System is already running. Please wait.")
             return
         
         self.run_button.config(state='disabled')
+        self.resume_button.config(state='disabled')
+        self.stop_button.config(state='normal')
         self.log_text.config(state='normal')
         self.log_text.delete(1.0, tk.END)
         self.log_text.insert(tk.END, "Starting agent system...\n")
@@ -277,32 +429,34 @@ class AgentSystemGUI:
         self.console_text.insert(tk.END, "Console ready.\n")
         self.console_text.config(state='disabled')
         
-        # Clear previous outputs
-        project_dir = os.path.join(os.getcwd(), "project")
-        for folder in ["comms", "src", "tests"]:
-            folder_path = os.path.join(project_dir, folder)
-            if os.path.exists(folder_path):
-                for file in glob.glob(os.path.join(folder_path, "*")):
-                    try:
-                        os.remove(file)
-                    except OSError as e:
-                        print(f"Error clearing file {file}: {e}")
+        # Clear previous outputs; a resumed run keeps the artifacts recorded in the journal
+        clear_project_outputs(["comms"] if resume else ["comms", "src", "tests"])
         
         # Run main.py in a thread
-        self.execution_thread = threading.Thread(target=self.execute_main)
+        self.cancel_token = CancelToken()
+        self.execution_thread = threading.Thread(target=self.execute_main, args=(resume, self.cancel_token))
         self.execution_thread.daemon = True
         self.execution_thread.start()
 
-    def execute_main(self):
+    def stop_system(self):
+        """Cancel the running sprint; model calls and test processes are abandoned."""
+        if self.cancel_token:
+            print("Stopping agent system")
+            self.cancel_token.cancel("stopped by user")
+            self.stop_button.config(state='disabled')
+
+    def execute_main(self, resume=False, cancel_token=None):
         """Execute main.py with output redirection."""
         try:
-            main.main(self.output_queue, self.console_queue)
+            main.main(self.output_queue, self.console_queue, resume=resume, cancel_token=cancel_token)
         except Exception as e:
             self.output_queue.put(f"Error: {str(e)}\n")
             print(f"Execution error: {e}", file=sys.stderr)
         finally:
             self.output_queue.put("--- Execution complete ---\n")
             self.root.after(0, lambda: self.run_button.config(state='normal'))
+            self.root.after(0, lambda: self.resume_button.config(state='normal'))
+            self.root.after(0, lambda: self.stop_button.config(state='disabled'))
 
     def process_output_queue(self):
         """Process output queue and update log display."""
@@ -401,7 +555,11 @@ class AgentSystemGUI:
         """Clean up on window close."""
         self.running = False
         if self.execution_thread and self.execution_thread.is_alive():
-            print("Waiting for execution thread to finish")
+            print("Cancelling execution thread")
+            self.cancel_token.cancel("window closed")
+            self.execution_thread.join(timeout=1.0)
+        self.llm_stream.cancel()
+        self.chat_stream.cancel()
         self.root.destroy()
 
     def create_llm_tab(self):
@@ -413,7 +571,7 @@ class AgentSystemGUI:
         llm_selector_frame.pack(pady=5, padx=10, fill=tk.X)
 
         ttk.Label(llm_selector_frame, text="Select LLM:").pack(side=tk.LEFT, padx=(0, 5))
-        self.llm_options = ["GPT-4", "Llama-3", "Custom-LLM"]  # Example LLMs
+        self.llm_options = ["qwen3-custom", "qwen3:0.6b"]  # Local models pulled by setup_local_qwen.sh
         self.llm_var = tk.StringVar(value=self.llm_options[0])
         llm_dropdown = ttk.Combobox(llm_selector_frame, textvariable=self.llm_var, values=self.llm_options, state="readonly", width=15)
         llm_dropdown.pack(side=tk.LEFT, padx=(0, 15))
@@ -446,9 +604,18 @@ class AgentSystemGUI:
 
         self.llm_entry = ttk.Entry(self.llm_frame, width=50)
         self.llm_entry.pack(padx=10, pady=5, side=tk.LEFT, fill=tk.X, expand=True)
+        self.llm_entry.bind("<Return>", lambda e: self.llm_send())
 
-        send_btn = ttk.Button(self.llm_frame, text="Send", command=self.llm_send)
-        send_btn.pack(padx=5, pady=5, side=tk.LEFT)
+        self.llm_send_btn = ttk.Button(self.llm_frame, text="Send", command=self.llm_send)
+        self.llm_send_btn.pack(padx=5, pady=5, side=tk.LEFT)
+        self.llm_cancel_btn = ttk.Button(self.llm_frame, text="Cancel", state='disabled',
+                                         command=lambda: self.llm_stream.cancel())
+        self.llm_cancel_btn.pack(padx=5, pady=5, side=tk.LEFT)
+        self.llm_rate_var = tk.StringVar(value="-- tok/s")
+        ttk.Label(self.llm_frame, textvariable=self.llm_rate_var, width=10).pack(padx=5, pady=5, side=tk.LEFT)
+
+        self.llm_stream = ChatStream(self.root, self.llm_client, self.llm_text, self.llm_rate_var, "LLM",
+                                     on_done=lambda: self.set_stream_buttons(self.llm_send_btn, self.llm_cancel_btn, False))
 
     def on_llm_mode_change(self, event=None):
         mode = self.llm_mode_var.get()
@@ -459,12 +626,18 @@ class AgentSystemGUI:
 
     def llm_send(self):
         prompt = self.llm_entry.get()
-        if prompt:
-            self.llm_text.insert(tk.END, f"You: {prompt}\n")
+        if not prompt:
+            return
+        if self.llm_mode_var.get() != "Local":
+            messagebox.showinfo("LLM", "Only local models are supported at the moment.")
+            return
+        if self.llm_stream.send(prompt, model=self.llm_var.get()):
             self.llm_entry.delete(0, tk.END)
-            # Placeholder for LLM response
-            self.llm_text.insert(tk.END, "LLM: [response goes here]\n")
-            self.llm_text.see(tk.END)
+            self.set_stream_buttons(self.llm_send_btn, self.llm_cancel_btn, True)
+
+    def set_stream_buttons(self, send_btn, cancel_btn, streaming):
+        send_btn.config(state='disabled' if streaming else 'normal')
+        cancel_btn.config(state='normal' if streaming else 'disabled')
 
     def open_api_key_link(self):
         import webbrowser
@@ -496,23 +669,44 @@ class AgentSystemGUI:
         self.chat_entry.pack(padx=10, pady=5, side=tk.LEFT, fill=tk.X, expand=True)
         self.chat_entry.bind("<Return>", self.chat_send)
 
-        send_btn = ttk.Button(self.chat_frame, text="Send", command=self.chat_send)
-        send_btn.pack(padx=5, pady=5, side=tk.LEFT)
+        self.chat_send_btn = ttk.Button(self.chat_frame, text="Send", command=self.chat_send)
+        self.chat_send_btn.pack(padx=5, pady=5, side=tk.LEFT)
+        self.chat_cancel_btn = ttk.Button(self.chat_frame, text="Cancel", state='disabled',
+                                          command=lambda: self.chat_stream.cancel())
+        self.chat_cancel_btn.pack(padx=5, pady=5, side=tk.LEFT)
+        self.chat_rate_var = tk.StringVar(value="-- tok/s")
+        ttk.Label(self.chat_frame, textvariable=self.chat_rate_var, width=10).pack(padx=5, pady=5, side=tk.LEFT)
+
+        self.chat_stream = ChatStream(self.root, self.llm_client, self.chat_text, self.chat_rate_var, "Bot",
+                                      on_done=lambda: self.set_stream_buttons(self.chat_send_btn, self.chat_cancel_btn, False))
 
     def chat_send(self, event=None):
         """Handle sending a chat message."""
         message = self.chat_entry.get()
-        if message:
-            self.chat_text.config(state='normal')
-            self.chat_text.insert(tk.END, f"You: {message}\n")
-            self.chat_text.config(state='disabled')
+        if message and self.chat_stream.send(message):
             self.chat_entry.delete(0, tk.END)
-            self.chat_text.see(tk.END)
-            # Placeholder for bot response
-            self.chat_text.config(state='normal')
-            self.chat_text.insert(tk.END, "Bot: [response goes here]\n")
-            self.chat_text.config(state='disabled')
-            self.chat_text.see(tk.END)
+            self.set_stream_buttons(self.chat_send_btn, self.chat_cancel_btn, True)
+
+def open_cassette(args):
+    """Cassette selected by --record or --replay, or None."""
+    if args.record and args.replay:
+        sys.exit("Use either --record or --replay, not both")
+    if args.record:
+        return Cassette(args.record, mode=Cassette.RECORD)
+    if args.replay:
+        if not os.path.exists(args.replay):
+            sys.exit(f"Cassette {args.replay} not found")
+        return Cassette(args.replay, mode=Cassette.REPLAY, realtime=args.replay_latency)
+    return None
+
+def install_sigint_handler(cancel_token):
+    """First Ctrl+C cancels the run cooperatively; a second one interrupts immediately."""
+    def handler(signum, frame):
+        if cancel_token.is_set():
+            raise KeyboardInterrupt
+        print("\nInterrupt received, cancelling run (press Ctrl+C again to force quit)...")
+        cancel_token.cancel("interrupted")
+    signal.signal(signal.SIGINT, handler)
 
 def run_gui():
     root = tk.Tk()
@@ -522,26 +716,60 @@ def run_gui():
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Agent System CLI")
-    parser.add_argument('command', choices=['run', 'view-code', 'view-tests', 'gui'], default='gui', nargs='?', help="Command to execute (default: gui)")
+    parser.add_argument('command', choices=['run', 'resume', 'view-code', 'view-tests', 'artifacts', 'rollback', 'broker', 'worker', 'daemon', 'submit', 'status', 'replay', 'tune', 'calibrate', 'gui'], default='gui', nargs='?', help="Command to execute (default: gui)")
+    parser.add_argument('--run-id', help="Run to inspect or roll back to (default: the latest run)")
+    parser.add_argument('--broker', help="Broker URL; 'run' dispatches to workers and 'worker' consumes from it (e.g. http://127.0.0.1:8765)")
+    parser.add_argument('--agent', help="Agent from config/agents.json that a 'worker' process runs as")
+    parser.add_argument('--host', default="127.0.0.1", help="Address the 'broker' and 'daemon' commands listen on")
+    parser.add_argument('--port', type=int, help="Port the 'broker' (default 8765) or 'daemon' (default 8766) command listens on")
+    parser.add_argument('--socket', help="Unix socket the 'daemon' command listens on instead of a TCP port")
+    parser.add_argument('--daemon', default=DEFAULT_DAEMON_URL, help="Daemon that 'submit' sends to (http://host:port or unix:///path)")
+    parser.add_argument('--tasks', default=os.path.join("config", "tasks.json"), help="Task file that 'submit' sends")
+    parser.add_argument('--interactive', action='store_true', help="Submit ahead of queued batch submissions, preempting a running one")
+    parser.add_argument('--priority', type=int, default=0, help="Priority of the submission within its class (higher runs first)")
+    parser.add_argument('--task-id', type=int, help="Only replay messages about this task")
+    parser.add_argument('--since', type=float, help="Only replay messages archived at or after this Unix time")
+    parser.add_argument('--requeue', action='store_true', help="Deliver replayed messages to the agents' mailboxes again")
+    parser.add_argument('--models', help="Comma-separated models for 'tune' (default: all installed); 'calibrate' uses the first")
+    parser.add_argument('--threshold', type=float, default=0.8, help="Pass rate a model needs in 'tune' to be suggested")
+    parser.add_argument('--repeat', type=int, default=1, help="Times 'tune' runs each calibration task (and 'calibrate' each setting)")
+    parser.add_argument('--apply', action='store_true', help="Write the models suggested by 'tune', or the settings found by 'calibrate', into config/agents.json")
+    parser.add_argument('--record', metavar='CASSETTE', help="Record the model traffic of 'run'/'resume' to this cassette file")
+    parser.add_argument('--replay', metavar='CASSETTE', help="Answer the model requests of 'run'/'resume' from this cassette instead of the server")
+    parser.add_argument('--replay-latency', action='store_true', help="With --replay, wait as long as each recorded request took")
+    parser.add_argument('--profile', nargs='?', const=os.path.join("project", "trace.json"), metavar='TRACE_FILE',
+                        help="Trace 'run'/'resume' stages and write Chrome trace JSON (default: project/trace.json)")
     args = parser.parse_args()
 
     if args.command == 'gui':
         run_gui()
     elif args.command == 'run':
         # Clear previous outputs (like in run_system)
-        project_dir = os.path.join(os.getcwd(), "project")
-        for folder in ["comms", "src", "tests"]:
-            folder_path = os.path.join(project_dir, folder)
-            if os.path.exists(folder_path):
-                for file in glob.glob(os.path.join(folder_path, "*")):
-                    try:
-                        os.remove(file)
-                    except OSError as e:
-                        print(f"Error clearing file {file}: {e}")
+        clear_project_outputs()
         
         # Run the main logic without queues (uses console prints)
         print("Starting agent system...")
-        main.main()  # No queues, so output goes to stdout
+        cancel_token = CancelToken()
+        install_sigint_handler(cancel_token)
+        if args.profile:
+            trace.enable()
+        main.main(cancel_token=cancel_token, broker_url=args.broker, cassette=open_cassette(args))  # No queues, so output goes to stdout
+        if args.profile:
+            print(f"Trace written to {trace.export_chrome(args.profile)}")
+            print(trace.format_summary())
+        print("--- Execution complete ---")
+    elif args.command == 'resume':
+        # Keep src/ and tests/ so completed work recorded in the journal can be reused
+        clear_project_outputs(["comms"])
+        print("Resuming agent system...")
+        cancel_token = CancelToken()
+        install_sigint_handler(cancel_token)
+        if args.profile:
+            trace.enable()
+        main.main(resume=True, cancel_token=cancel_token, broker_url=args.broker, cassette=open_cassette(args))
+        if args.profile:
+            print(f"Trace written to {trace.export_chrome(args.profile)}")
+            print(trace.format_summary())
         print("--- Execution complete ---")
     elif args.command == 'view-code':
         src_dir = os.path.join(os.getcwd(), "project", "src")
@@ -556,6 +784,124 @@ if __name__ == "__main__":
                         print("\n")
                 except OSError as e:
                     print(f"Error reading {file}: {e}")
+    elif args.command == 'broker':
+        port = args.port or 8765
+        server = serve_broker(args.host, port)
+        print(f"Broker listening on http://{args.host}:{port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.shutdown()
+    elif args.command == 'worker':
+        if not args.agent or not args.broker:
+            parser.error("worker requires --agent and --broker")
+        project_dir = os.path.join(os.getcwd(), "project")
+        agents = main.load_agents("config/agents.json", project_dir)
+        if args.agent not in agents:
+            parser.error(f"unknown agent '{args.agent}'")
+        agent = agents[args.agent]
+        cancel_token = CancelToken()
+        install_sigint_handler(cancel_token)
+        agent.cancel_token = cancel_token
+        consumer = f"{agent.name}@{socket.gethostname()}:{os.getpid()}"
+        run_worker(agent, BrokerClient(args.broker, consumer=consumer), cancel_token)
+    elif args.command == 'daemon':
+        project_dir = os.path.join(os.getcwd(), "project")
+        os.makedirs(project_dir, exist_ok=True)
+        main.ensure_model_server(CancelToken())
+        daemon = AgentDaemon(project_dir, "config/agents.json", main.load_agents, main.run_tasks)
+        server = serve_daemon(daemon, args.host, args.port or 8766, socket_path=args.socket)
+        daemon.start()
+        print(f"Daemon listening on {'unix://' + args.socket if args.socket else f'http://{args.host}:{args.port or 8766}'}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.shutdown()
+        finally:
+            daemon.stop()
+            if args.socket and os.path.exists(args.socket):
+                os.remove(args.socket)
+    elif args.command == 'submit':
+        with open(args.tasks, "r") as f:
+            tasks = json.load(f)["tasks"]
+        client = DaemonClient(args.daemon)
+        submission_id = None
+        state = None
+        try:
+            task_class = "interactive" if args.interactive else "batch"
+            for event in client.submit_and_stream(tasks, task_class=task_class, priority=args.priority):
+                if event["type"] == "log":
+                    print(event["text"])
+                    continue
+                state = event["state"]
+                if state == "queued":
+                    submission_id = event["id"]
+                    print(f"Submitted {len(tasks)} task(s) ({event['position']} submission(s) ahead)")
+                elif state == "running":
+                    print(f"Running as run {event['run_id']}")
+                elif state == "preempted":
+                    print(f"Preempted by a more urgent submission; {event['remaining']} task(s) requeued")
+                else:
+                    for key, task_state in sorted(event["results"].items()):
+                        print(f"  {key}: {task_state}")
+        except KeyboardInterrupt:
+            if submission_id:
+                client.cancel(submission_id)
+                print(f"Cancelled submission {submission_id}")
+        except (OSError, DaemonError) as e:
+            sys.exit(f"Cannot submit to daemon at {args.daemon}: {e}")
+        print(f"--- Submission {state or 'lost'} ---")
+    elif args.command == 'status':
+        status = read_status(os.path.join(os.getcwd(), "project"))
+        if status is None:
+            print("No run status available yet.")
+        else:
+            print(format_status(status))
+            for agent, counts in sorted(status["agents"].items()):
+                print(f"  {agent:<20} queued {counts['queue_depth']:>5}  completed {counts['completed']:>5}  failed {counts['failed']:>5}")
+            if status["tasks_per_min"]:
+                print(f"  throughput {status['tasks_per_min']:.1f} tasks/min")
+    elif args.command == 'tune':
+        project_dir = os.path.join(os.getcwd(), "project")
+        os.makedirs(project_dir, exist_ok=True)
+        models = args.models.split(",") if args.models else None
+        tune(project_dir, "config/agents.json", models=models, threshold=args.threshold,
+             repeat=args.repeat, apply=args.apply)
+    elif args.command == 'calibrate':
+        project_dir = os.path.join(os.getcwd(), "project")
+        os.makedirs(project_dir, exist_ok=True)
+        model = args.models.split(",")[0] if args.models else None
+        calibrate(project_dir, "config/agents.json", model=model, repeat=args.repeat, apply=args.apply)
+    elif args.command == 'replay':
+        project_dir = os.path.join(os.getcwd(), "project")
+        archive = MessageArchive.shared(os.path.join(project_dir, "archive"))
+        replayed = 0
+        for message in archive.replay(agent=args.agent, task_id=args.task_id, since=args.since):
+            print(json.dumps(message))
+            if args.requeue and message["recipient"].startswith("topic:"):
+                TopicBus(os.path.join(project_dir, "comms")).publish(
+                    message["recipient"][len("topic:"):], message["sender"], message["message"])
+            elif args.requeue:
+                mailbox = os.path.join(project_dir, "comms", f"msg_{message['recipient']}_{message['sender']}.json")
+                with open(mailbox, "a") as f:
+                    f.write(json.dumps(message) + "\n")
+            replayed += 1
+        print(f"{replayed} message(s) replayed" + (" and requeued" if args.requeue else ""))
+    elif args.command in ('artifacts', 'rollback'):
+        project_dir = os.path.join(os.getcwd(), "project")
+        store = ArtifactStore(project_dir)
+        runs = store.runs()
+        run_id = args.run_id or (runs[-1] if runs else None)
+        if run_id not in runs:
+            print("No artifacts recorded for that run." if args.run_id else "No artifacts recorded yet.")
+        elif args.command == 'artifacts':
+            print(f"Artifacts for run {run_id}:")
+            for entry in store.lookup(run_id=run_id):
+                print(f"  task {entry['task_id']} {entry['agent']}: {entry['name']} -> {entry['sha'][:12]}")
+        else:
+            clear_project_outputs(["src"])
+            for path in store.rollback(run_id, os.path.join(project_dir, "src")):
+                print(f"Restored {os.path.relpath(path, project_dir)}")
     elif args.command == 'view-tests':
         result_file = os.path.join(os.getcwd(), "project", "tests", "test_result.txt")
         if not os.path.exists(result_file):
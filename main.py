@@ -4,6 +4,19 @@ print("Current Working Directory:", os.getcwd())
 from agents.manager import ManagerAgent
 from agents.developer import DeveloperAgent
 from agents.tester import TestingAgent
+from agents.journal import RunJournal
+from agents.progress import ProgressTracker
+from agents.cancel import CancelToken
+from agents.artifacts import ArtifactStore
+from agents.broker import BrokerClient
+from agents.archive import MessageArchive
+from agents.reasoning import ReasoningPolicy
+from agents import trace
+from agents.llm import DEFAULT_MODEL, LocalModelClient
+from agents.semantic_cache import SemanticCache
+from agents.hardware import detect_hardware, inference_profile, describe
+from agents.scheduler import FairScheduler, task_order
+from agents.worker import result_queue
 import queue
 import sys
 from io import StringIO
@@ -29,25 +42,28 @@ class StdoutQueue:
     def flush(self):
         pass
 
-def has_nvidia_gpu():
+def load_semantic_cache(cache_config, project_dir):
+    """SemanticCache shared by the developers, or None unless enabled in the config."""
+    if not cache_config.get("enabled", False):
+        return None
+    embedder = LocalModelClient("SemanticCache")
+    model = cache_config.get("model", "nomic-embed-text")
     try:
-        subprocess.check_output(['nvidia-smi'])
-        return True
-    except Exception:
-        return False
-
-def has_amd_gpu():
-    try:
-        subprocess.check_output(['rocm-smi'])
-        return True
-    except Exception:
-        return False    
+        return SemanticCache(project_dir, lambda texts: embedder.embed(texts, model=model),
+                             threshold=cache_config.get("threshold", 0.9), top_k=cache_config.get("top_k", 3))
+    except RuntimeError as e:
+        print(f"Semantic cache disabled: {e}")
+        return None
 
 def load_agents(config_file, project_dir):
     """Load agents from JSON configuration."""
     print(f"Loading agents from {config_file}")
     with open(config_file, "r") as f:
         config = json.load(f)
+    MessageArchive.shared(os.path.join(project_dir, "archive")).configure(**config.get("archive", {}))
+    semantic_cache = load_semantic_cache(config.get("semantic_cache", {}), project_dir)
+    hardware = detect_hardware()
+    profile = dict(inference_profile(hardware), **config.get("profile", {}))
     
     agents = {}
     for agent_config in config["agents"]:
@@ -62,58 +78,263 @@ def load_agents(config_file, project_dir):
             agents[name] = ManagerAgent(name, role, skills, description, project_dir)
         elif agent_type == "developer":
             specialization = agent_config.get("specialization", "")
-            agents[name] = DeveloperAgent(name, role, skills, description, specialization, project_dir)
+            agents[name] = DeveloperAgent(
+                name, role, skills, description, specialization, project_dir,
+                speculative_k=agent_config.get("speculative_k", 1),
+                speculative_cancel=agent_config.get("speculative_cancel", "first_valid"),
+                pack_size=agent_config.get("pack_size", 1)
+            )
+            agents[name].semantic_cache = semantic_cache
         elif agent_type == "tester":
             agents[name] = TestingAgent(name, role, skills, description, project_dir)
         else:
             print(f"Warning: Unknown agent type '{agent_type}' for agent '{name}'. Skipping.")
+            continue
+
+        agents[name].agent_type = agent_type
+        agents[name].llm.model = agent_config.get("model", DEFAULT_MODEL)
+        agents[name].model_options = agent_config.get("options", {})
+        agents[name].inference_profile = dict(profile, **agent_config.get("profile", {}))
+        agents[name].subscriptions = agent_config.get("subscribe", [])
+        agents[name].weight = agent_config.get("weight", 1.0)
+        agents[name].reasoning = ReasoningPolicy(**dict(config.get("reasoning", {}), **agent_config.get("reasoning", {})))
+        if agent_config.get("session", False):
+            agents[name].enable_session(max_turns=agent_config.get("session_turns", 4))
     
     return agents
 
-def perform_task_with_retries(agent, task, max_retries=3, timeout=30, console_queue=None):
-    """Perform a task with retries in case of API call failures."""
+def perform_task_with_retries(agent, task, max_retries=3, timeout=30, console_queue=None, journal=None, cancel_token=None):
+    """Perform a task with retries in case of API call failures, journaling state transitions.
+
+    Returns the task's final state: RunJournal.COMPLETED, FAILED or CANCELLED.
+    """
     retries = 0
     while retries < max_retries:
+        if cancel_token and cancel_token.is_set():
+            break
+        if journal:
+            journal.record(agent.name, task["id"], RunJournal.STARTED)
         try:
-            if console_queue:
-                agent.perform_task(task, console_queue=console_queue)
-            else:
-                agent.perform_task(task)
-            return True  # Task succeeded
+            with trace.span("task", agent.name):
+                if console_queue:
+                    artifacts = agent.perform_task(task, console_queue=console_queue)
+                else:
+                    artifacts = agent.perform_task(task)
+            if cancel_token and cancel_token.is_set():
+                if journal:
+                    journal.record(agent.name, task["id"], RunJournal.CANCELLED)
+                print(f"{agent.name} task {task['id']} cancelled ({cancel_token.reason})")
+                return RunJournal.CANCELLED
+            state = RunJournal.COMPLETED if artifacts else RunJournal.FAILED
+            if journal:
+                journal.record(agent.name, task["id"], state, artifacts)
+            return state
         except RequestException as e:
             retries += 1
+            if journal:
+                journal.record(agent.name, task["id"], RunJournal.FAILED)
             print(f"{agent.name} API call failed: {e}. Retrying ({retries}/{max_retries})...")
-            time.sleep(60)  # Wait before retrying
+            if cancel_token:
+                cancel_token.wait(60)  # Wait before retrying
+            else:
+                time.sleep(60)
+    if cancel_token and cancel_token.is_set():
+        return RunJournal.CANCELLED
     print(f"{agent.name} failed to complete task {task['id']} after {max_retries} retries.")
+    return RunJournal.FAILED
+
+def run_tasks(agents, tasks, journal, cancel_token, console_queue=None, preempt=None, start=None):
+    """Distribute tasks through the manager, then have developers and the tester work through them.
+
+    Each phase runs its agents' tasks in FairScheduler order; relative deadlines count
+    from start (default: now). preempt, if given, is checked before each task; when it
+    returns True the run stops taking new tasks so more urgent work can go first, and
+    True is returned. The unfinished tasks stay unrecorded in the journal.
+    """
+    manager = agents["ProjectOrchestrator"]
+    manager.task_list = tasks
+    manager.progress.start_run(journal.run_id)
+    manager.perform_task({"type": "distribute"})
+    scheduler = FairScheduler({name: agent.weight for name, agent in agents.items()}, start=start)
+
+    # Developers process assigned tasks, then the tester tests their output
+    print("Developers processing tasks")
+    developers = [agent for agent in agents.values() if isinstance(agent, DeveloperAgent)]
+    preempted = run_phase(developers, scheduler, manager, journal, cancel_token, preempt=preempt)
+    tester = agents.get("Tester1")
+    if preempted and tester:
+        tester.receive_messages()  # Drop its assignments; they are redistributed when the run is resumed
+    elif tester:
+        print("Tester processing tasks")
+        preempted = run_phase([tester], scheduler, manager, journal, cancel_token, console_queue=console_queue, preempt=preempt)
+
+    for agent_name, task, late in scheduler.misses:
+        manager.report(f"{agent_name} missed the deadline of task '{task['description']}' by {late:.1f}s")
+    if scheduler.misses:
+        print(f"{len(scheduler.misses)} task(s) missed their deadline")
+    manager.progress.finish()
+    manager.generate_progress_report()
+    return preempted
+
+def run_phase(phase_agents, scheduler, manager, journal, cancel_token, console_queue=None, preempt=None):
+    """Queue the tasks in these agents' mailboxes on the scheduler and run them in its order."""
+    agents = {agent.name: agent for agent in phase_agents}
+    for agent in phase_agents:
+        queued = set()
+        for msg in agent.receive_messages():
+            if "task" not in msg["message"]:
+                continue
+            task = msg["message"]["task"]
+            if journal.is_completed(agent.name, task["id"]):
+                print(f"{agent.name} skipping task {task['id']}: already completed in run {journal.run_id}")
+                manager.progress.record(agent.name, task["id"], "skipped")
+            elif task["id"] not in queued:
+                queued.add(task["id"])
+                scheduler.add(agent.name, task)
+
+    while not cancel_token.is_set():
+        if preempt and len(scheduler) and preempt():
+            print(f"Yielding to more urgent work with {len(scheduler)} task(s) still queued")
+            return True
+        picked = scheduler.next()
+        if picked is None:
+            break
+        agent_name, task = picked
+        agent = agents[agent_name]
+        if isinstance(agent, DeveloperAgent) and agent.pack_size > 1:
+            # Answer this task together with the agent's next queued ones in one model call
+            agent.pack([task] + scheduler.peek(agent_name, agent.pack_size - 1))
+        if console_queue:
+            state = perform_task_with_retries(agent, task, console_queue=console_queue, journal=journal, cancel_token=cancel_token)
+        else:
+            state = perform_task_with_retries(agent, task, journal=journal, cancel_token=cancel_token)
+        manager.report(f"{agent_name} {state} task '{task['description']}'")
+        late = scheduler.done(agent_name, task)
+        if late is not None:
+            print(f"{agent_name} finished task {task['id']} {late:.1f}s after its deadline")
     return False
 
-def main(output_queue=None, console_queue=None):
-    """Main function with optional output and console queues for GUI."""
-    # Check if qwen-custom Ollama instance is running
+def run_distributed(manager, broker_url, journal, cancel_token, project_dir):
+    """Run the sprint on networked workers: code tasks first, then tests against their output.
+
+    Tasks go to per-type broker queues, so any number of workers of a type share the
+    load. Results carry the produced files, which are stored locally and sent along
+    with test tasks so testers on other hosts can import them.
+    """
+    broker = BrokerClient(broker_url, consumer=f"orchestrator-{journal.run_id}")
+    manager.progress.start_run(journal.run_id)
+    store = ArtifactStore(project_dir)
+    src_dir = os.path.join(project_dir, "src")
+    os.makedirs(src_dir, exist_ok=True)
+    # The broker hands tasks out in the order they are queued, so queue them in priority order
+    scheduler = FairScheduler()
+    ordered = sorted(manager.task_list, key=lambda t: task_order(t, scheduler.start))
+    tasks_by_id = {t["id"]: t for t in ordered}
+    code_tasks = [t for t in ordered if t["type"] != "test"]
+    test_tasks = [t for t in ordered if t["type"] == "test"]
+    results = result_queue(journal.run_id)
+    pending = {}  # task id -> journal agent of the tasks queued and not yet finished
+    for phase in (code_tasks, test_tasks):
+        if cancel_token.is_set():
+            break
+        sources = {}
+        if phase is test_tasks:
+            for name in os.listdir(src_dir):
+                if name.endswith(".py"):
+                    with open(os.path.join(src_dir, name), "r") as f:
+                        sources[name] = f.read()
+        for task in phase:
+            if cancel_token.is_set():
+                break
+            journal_agent = f"queue:{task['type']}"
+            if journal.is_completed(journal_agent, task["id"]):
+                print(f"Skipping task {task['id']}: already completed in run {journal.run_id}")
+                continue
+            manager.queue_task(task, broker, sources=sources, cancel_token=cancel_token, run_id=journal.run_id)
+            journal.record(journal_agent, task["id"], RunJournal.STARTED)
+            pending[task["id"]] = journal_agent
+
+        while pending and not cancel_token.is_set():
+            leased = broker.consume(results, wait=2)
+            if leased is None:
+                continue
+            result = leased["body"]
+            journal_agent = pending.pop(result["task_id"], None)
+            if journal_agent is None:
+                broker.ack(leased["id"])  # Duplicate from a redelivered task
+                continue
+            paths = []
+            for rel_path, content in result["artifacts"].items():
+                path = os.path.join(project_dir, rel_path)
+                if os.path.dirname(rel_path) == "src":
+                    sha = store.put(content)
+                    store.record(sha, os.path.basename(rel_path), result["task_id"], result["agent"], run_id=journal.run_id)
+                    store.materialize(sha, path)
+                else:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    with open(path, "w") as f:
+                        f.write(content)
+                paths.append(path)
+            state = RunJournal.COMPLETED if result["ok"] else RunJournal.FAILED
+            journal.record(journal_agent, result["task_id"], state, paths)
+            print(f"{result['agent']} finished task {result['task_id']}: {state}")
+            manager.report(f"{result['agent']} finished task {result['task_id']}: {state}")
+            late = scheduler.check_deadline(result["agent"], tasks_by_id[result["task_id"]])
+            if late is not None:
+                print(f"{result['agent']} finished task {result['task_id']} {late:.1f}s after its deadline")
+                manager.report(f"{result['agent']} missed the deadline of task {result['task_id']} by {late:.1f}s")
+            broker.ack(leased["id"])
+    if cancel_token.is_set():
+        for task_id, journal_agent in pending.items():
+            journal.record(journal_agent, task_id, RunJournal.CANCELLED)
+    manager.progress.finish()
+
+def ensure_model_server(cancel_token):
+    """Start an Ollama instance for the default model unless one is already running."""
+    # Check if the default model's Ollama instance is running
     def is_qwen_running():
         if psutil is None:
             return False  # psutil not available, can't check
         for proc in psutil.process_iter(['name', 'cmdline']):
             try:
                 if proc.info['name'] and 'ollama' in proc.info['name'].lower():
-                    if proc.info['cmdline'] and any('qwen-custom' in str(arg) for arg in proc.info['cmdline']):
+                    if proc.info['cmdline'] and any(DEFAULT_MODEL in str(arg) for arg in proc.info['cmdline']):
                         return True
             except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
                 continue
         return False
 
     if not is_qwen_running():
-        print("Qwen-custom Ollama instance not running. Starting...")
+        print(f"{DEFAULT_MODEL} Ollama instance not running. Starting...")
         try:
-            # Start ollama run qwen-custom in background
-            subprocess.Popen(['ollama', 'run', 'qwen-custom'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            # Start ollama run <model> in background
+            subprocess.Popen(['ollama', 'run', DEFAULT_MODEL], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
             # Wait a bit for the server to start
-            time.sleep(60)
-            print("Qwen-custom Ollama instance started.")
+            cancel_token.wait(60)
+            print(f"{DEFAULT_MODEL} Ollama instance started.")
         except Exception as e:
-            print(f"Failed to start qwen-custom Ollama instance: {e}")
+            print(f"Failed to start {DEFAULT_MODEL} Ollama instance: {e}")
     else:
-        print("Qwen-custom Ollama instance already running.")
+        print(f"{DEFAULT_MODEL} Ollama instance already running.")
+
+def main(output_queue=None, console_queue=None, resume=False, cancel_token=None, broker_url=None, cassette=None):
+    """Main function with optional output and console queues for GUI.
+
+    With resume=True the most recent run in the journal is continued: tasks that already
+    completed with unchanged artifacts are skipped and only unfinished ones are re-run.
+    Cancelling cancel_token stops the run: in-flight model calls and test processes are
+    abandoned and the interrupted tasks are journaled as cancelled.
+    With broker_url set, tasks are queued on that broker for worker processes instead of
+    being run by the agents in this process.
+    With a cassette (agents/cassette.py), model traffic is recorded to it or, when it is
+    replaying, answered from it without a model server.
+    """
+    if cancel_token is None:
+        cancel_token = CancelToken()
+
+    LocalModelClient.cassette = cassette
+    if cassette is None or not cassette.replaying:
+        ensure_model_server(cancel_token)
 
     # Redirect stdout if queue is provided
     if output_queue:
@@ -121,17 +342,27 @@ def main(output_queue=None, console_queue=None):
     
     try:
         print("Starting main script")
+        started = time.time()
         project_dir = os.path.join(os.getcwd(), "project")
         os.makedirs(project_dir, exist_ok=True)
+
+        journal = RunJournal(project_dir)
+        journal.listeners.append(ProgressTracker.shared(project_dir).record)
+        run_id = journal.start_run(resume=resume)
+        if resume:
+            in_flight = journal.in_flight()
+            print(f"Resuming run {run_id}; {len(in_flight)} in-flight task(s) will be restarted.")
+        else:
+            print(f"Starting run {run_id}")
         
         # Load agents
         config_file = "config/agents.json"
         agents = load_agents(config_file, project_dir)
         
-        has_gpu = has_nvidia_gpu() or has_amd_gpu()
         for agent in agents.values():
-            agent.use_gpu = has_gpu
-        print(f"GPU detected: {has_gpu}. Ollama will attempt to use GPU if True.")
+            agent.run_id = run_id
+            agent.cancel_token = cancel_token
+        print(f"Hardware: {describe(detect_hardware())}. Inference profile: {agents['ProjectOrchestrator'].inference_profile}")
 
         # Example task file
         task_file = "config/tasks.json"
@@ -144,19 +375,23 @@ def main(output_queue=None, console_queue=None):
                         "description": "Implement Hello function",
                         "type": "code",
                         "function_name": "hello",
-                        "return_value": "Hello"
+                        "return_value": "Hello",
+                        "priority": 1
                     },
                     {
                         "id": 2,
                         "description": "Implement World function",
                         "type": "code",
                         "function_name": "world",
-                        "return_value": "World"
+                        "return_value": "World",
+                        "priority": 1
                     },
                     {
                         "id": 3,
                         "description": "Test Hello World output",
                         "type": "test",
+                        "priority": 0,
+                        "deadline": 600,
                         "test_spec": {
                             "combination": "print(hello() + ' ' + world())",
                             "expected_output": "Hello World"
@@ -170,44 +405,26 @@ def main(output_queue=None, console_queue=None):
         print("Manager processing tasks")
         manager = agents["ProjectOrchestrator"]
         manager.load_tasks(task_file)
-        manager.perform_task({"type": "distribute"})
-        
-        # Developers process assigned tasks
-        print("Developers processing tasks")
-        processed_tasks = {}
-        for agent_name, agent in agents.items():
-            if isinstance(agent, DeveloperAgent):
-                processed_tasks[agent_name] = set()
-                messages = agent.receive_messages()
-                for msg in messages:
-                    if "task" in msg["message"]:
-                        task = msg["message"]["task"]
-                        task_id = task["id"]
-                        if task_id not in processed_tasks[agent_name]:
-                            success = perform_task_with_retries(agent, task)
-                            if success:
-                                processed_tasks[agent_name].add(task_id)
-        
-        # Tester processes test task
-        print("Tester processing tasks")
-        tester = agents.get("Tester1")
-        if tester:
-            processed_tasks[tester.name] = set()
-            messages = tester.receive_messages()
-            for msg in messages:
-                if "task" in msg["message"]:
-                    task = msg["message"]["task"]
-                    task_id = task["id"]
-                    if task_id not in processed_tasks[tester.name]:
-                        # Pass console_queue to perform_task if available
-                        if console_queue:
-                            success = perform_task_with_retries(tester, task, console_queue=console_queue)
-                        else:
-                            success = perform_task_with_retries(tester, task)
-                        if success:
-                            processed_tasks[tester.name].add(task_id)
+        if broker_url:
+            print(f"Dispatching tasks to workers via broker at {broker_url}")
+            run_distributed(manager, broker_url, journal, cancel_token, project_dir)
+            manager.generate_progress_report()
+            return
+        run_tasks(agents, manager.task_list, journal, cancel_token, console_queue=console_queue)
+
+        if cancel_token.is_set():
+            print(f"Run {run_id} stopped: {cancel_token.reason}. Use resume to continue.")
+
+        # Model timing per agent; prompt_eval drops when the prompt prefix is reused
+        for agent in agents.values():
+            if agent.llm.calls:
+                print(agent.llm.summary())
+        if cassette:
+            print(cassette.summary())
+        print(f"Run {run_id} took {time.time() - started:.2f}s")
     
     finally:
+        LocalModelClient.cassette = None
         # Restore stdout
         if output_queue:
             sys.stdout = sys.__stdout__
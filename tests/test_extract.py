@@ -0,0 +1,34 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from agents.extract import extract_code, definitions_source, script_source, strip_think
+
+
+def test_unfenced_for_loop_is_kept():
+    assert script_source(extract_code("Sure:\nfor i in range(3):\n    print(i)\n")) == "for i in range(3):\n    print(i)"
+
+
+def test_unfenced_main_guard_is_kept():
+    reply = "import os\ndef hello():\n    return 'Hello'\nif __name__ == \"__main__\":\n    print(hello())"
+    source = script_source(extract_code(reply))
+    assert source.endswith("if __name__ == \"__main__\":\n    print(hello())")
+    assert definitions_source(extract_code(reply)) == "import os\n\ndef hello():\n    return 'Hello'"
+
+
+def test_unfenced_try_keeps_its_clauses():
+    reply = "Here:\ntry:\n    x = 1\nexcept Exception:\n    x = 2\nfinally:\n    pass\nprint(x)\nThat is all."
+    assert script_source(extract_code(reply)) == "try:\n    x = 1\nexcept Exception:\n    x = 2\nfinally:\n    pass\nprint(x)"
+
+
+def test_unfenced_if_else_is_one_block():
+    assert script_source(extract_code("if x:\n    a = 1\nelse:\n    a = 2\n")) == "if x:\n    a = 1\nelse:\n    a = 2"
+
+
+def test_trailing_unfenced_def_is_kept():
+    assert definitions_source(extract_code("Done.\ndef world():\n    return 'World'")) == "def world():\n    return 'World'"
+
+
+def test_strip_think_drops_closed_and_unclosed_sections():
+    reply = "<think>\n### TASK 1\n</think>\n### TASK 2\ndef a():\n    return 1\n<think>truncated\n### TASK 3"
+    assert strip_think(reply) == "### TASK 2\ndef a():\n    return 1"